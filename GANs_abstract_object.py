@@ -40,6 +40,9 @@ class GANs_model(metaclass=ABCMeta):
         self.D_error_fake_history = []
         self.G_error_history = []
         self.model_name = model_name
+        # ParameterArena of each player, built by train if requested
+        self.arena_G = None
+        self.arena_D = None
 
         if self.data_dimension[0] == 3:
             self.imtype = "RGB"
@@ -124,6 +127,8 @@ class GANs_model(metaclass=ABCMeta):
         n_classes,
         model_name,
         label_smoothing=False,
+        telemetry_path=None,
+        parameter_arena=False,
     ):
         if optimizer_name == "Jacobi":
             self.optimizer = Jacobi(
@@ -163,6 +168,32 @@ class GANs_model(metaclass=ABCMeta):
         #    )
         else:
             raise RuntimeError("Optimizer type is not valid")
+        # solver records flushed to telemetry_path after every epoch
+        self.telemetry_path = telemetry_path
+        if telemetry_path is not None:
+            self.optimizer.telemetry = SolverTelemetry()
+        if parameter_arena:
+            self.build_arenas()
+
+    def build_arenas(self):
+        self.arena_G = ParameterArena(self.G)
+        self.arena_D = ParameterArena(self.D)
+        # the optimizer applies its updates through the arenas
+        self.optimizer.arena_G = self.arena_G
+        self.optimizer.arena_D = self.arena_D
+
+    def flush_telemetry(self):
+        # solver records of the optimizer, if it keeps a SolverTelemetry
+        telemetry = getattr(self.optimizer, 'telemetry', None)
+        if telemetry is not None and len(telemetry) > 0:
+            path = getattr(self, 'telemetry_path', None) or self.save_path
+            self.createFolder(path)
+            telemetry.flush(
+                path
+                + "/solver_telemetry_MPI_rank_"
+                + str(self.mpi_rank)
+                + ".jsonl"
+            )
 
     def save_images(self, epoch_number, n_batch, images):
         count = 0
@@ -223,5 +254,7 @@ class GANs_model(metaclass=ABCMeta):
         label_smoothing=False,
         single_number=None,
         repeat_iterations=1,
+        parameter_arena=False,
+        telemetry_path=None,
     ):
         pass
@@ -54,6 +54,8 @@ class CGANs_CNN_model(GANs_abstract_object.GANs_model):
         label_smoothing=False,
         single_number=None,
         repeat_iterations=1,
+        parameter_arena=False,
+        telemetry_path=None,
     ):
         if single_number is not None:
             self.data = [
@@ -74,7 +76,14 @@ class CGANs_CNN_model(GANs_abstract_object.GANs_model):
         self.verbose = verbose
         self.save_path = save_path
         self.optimizer_initialize(
-            loss, lr_x, lr_y, optimizer_name, self.n_classes, self.model_name
+            loss,
+            lr_x,
+            lr_y,
+            optimizer_name,
+            self.n_classes,
+            self.model_name,
+            telemetry_path=telemetry_path,
+            parameter_arena=parameter_arena,
         )
         start = time.time()
         for e in range(num_epochs):
@@ -102,7 +111,7 @@ class CGANs_CNN_model(GANs_abstract_object.GANs_model):
 
                 if optimizer_name == 'Adam':
                     error_real, error_fake, g_error = self.optimizer.step(
-                        real_data, labels, N
+                        lambda: (real_data, labels, N)
                     )
                     self.D = self.optimizer.D
                     self.G = self.optimizer.G
@@ -133,6 +142,7 @@ class CGANs_CNN_model(GANs_abstract_object.GANs_model):
             self.D_error_fake_history.append(error_fake)
             self.G_error_history.append(g_error)
 
+            self.flush_telemetry()
             self.print_verbose(
                 "######################################################"
             )
@@ -50,6 +50,8 @@ class CGANs_MLP_model(GANs_abstract_object.GANs_model):
         label_smoothing=False,
         single_number=None,
         repeat_iterations=1,
+        parameter_arena=False,
+        telemetry_path=None,
     ):
         if single_number is not None:
             self.data = [
@@ -70,7 +72,14 @@ class CGANs_MLP_model(GANs_abstract_object.GANs_model):
         self.verbose = verbose
         self.save_path = save_path
         self.optimizer_initialize(
-            loss, lr_x, lr_y, optimizer_name, self.n_classes, self.model_name
+            loss,
+            lr_x,
+            lr_y,
+            optimizer_name,
+            self.n_classes,
+            self.model_name,
+            telemetry_path=telemetry_path,
+            parameter_arena=parameter_arena,
         )
         start = time.time()
         for e in range(num_epochs):
@@ -99,7 +108,7 @@ class CGANs_MLP_model(GANs_abstract_object.GANs_model):
 
                 if optimizer_name == 'Adam' or optimizer_name == 'Jacobi':
                     error_real, error_fake, g_error = self.optimizer.step(
-                        real_data, labels, N
+                        lambda: (real_data, labels, N)
                     )
                     self.D = self.optimizer.D
                     self.G = self.optimizer.G
@@ -131,6 +140,7 @@ class CGANs_MLP_model(GANs_abstract_object.GANs_model):
             self.D_error_fake_history.append(error_fake)
             self.G_error_history.append(g_error)
 
+            self.flush_telemetry()
             self.print_verbose(
                 "######################################################"
             )
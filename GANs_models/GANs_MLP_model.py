@@ -55,6 +55,8 @@ class GANs_MLP_model(GANs_abstract_object.GANs_model):
         label_smoothing=False,
         single_number=None,
         repeat_iterations=1,
+        parameter_arena=False,
+        telemetry_path=None,
     ):
         if single_number is not None or self.mpi_comm_size > 1:
 
@@ -86,6 +88,8 @@ class GANs_MLP_model(GANs_abstract_object.GANs_model):
             self.n_classes,
             self.model_name,
             label_smoothing,
+            telemetry_path=telemetry_path,
+            parameter_arena=parameter_arena,
         )
         start = time.time()
         for e in range(num_epochs):
@@ -104,36 +108,16 @@ class GANs_MLP_model(GANs_abstract_object.GANs_model):
 
                 if optimizer_name == 'GaussSeidel' or optimizer_name == 'Adam':
                     error_real, error_fake, g_error = self.optimizer.step(
-                        real_data, labels, N
+                        lambda: (real_data, labels, N)
                     )
                     self.D = self.optimizer.D
                     self.G = self.optimizer.G
                 else:
                     for i in np.arange(repeat_iterations):
 
-                        (
-                            error_real,
-                            error_fake,
-                            g_error,
-                            p_x,
-                            p_y,
-                        ) = self.optimizer.step(real_data, N)
-                        index = 0
-                        for p in self.G.parameters():
-                            p.data.add_(
-                                p_x[index : index + p.numel()].reshape(p.shape)
-                            )
-                            index += p.numel()
-                        if index != p_x.numel():
-                            raise RuntimeError('CG size mismatch')
-                        index = 0
-                        for p in self.D.parameters():
-                            p.data.add_(
-                                p_y[index : index + p.numel()].reshape(p.shape)
-                            )
-                            index += p.numel()
-                        if index != p_y.numel():
-                            raise RuntimeError('CG size mismatch')
+                        error_real, error_fake, g_error = self.optimizer.step(
+                            lambda: (real_data, N)
+                        )
 
                 self.print_verbose('Epoch: ', str(e + 1), '/', str(num_epochs))
                 self.print_verbose('Batch Number: ', str(n_batch + 1))
@@ -157,6 +141,7 @@ class GANs_MLP_model(GANs_abstract_object.GANs_model):
             self.D_error_fake_history.append(error_fake)
             self.G_error_history.append(g_error)
 
+            self.flush_telemetry()
             self.print_verbose(
                 "######################################################"
             )
@@ -50,6 +50,8 @@ class ResNet_model(GANs_abstract_object.GANs_model):
         label_smoothing=False,
         single_number=None,
         repeat_iterations=1,
+        parameter_arena=False,
+        telemetry_path=None,
     ):
         self.data_loader = torch.utils.data.DataLoader(
             self.data, batch_size=100, shuffle=True
@@ -85,6 +87,8 @@ class ResNet_model(GANs_abstract_object.GANs_model):
             self.n_classes,
             self.model_name,
             label_smoothing,
+            telemetry_path=telemetry_path,
+            parameter_arena=parameter_arena,
         )
         start = time.time()
         for e in range(num_epochs):
@@ -99,36 +103,15 @@ class ResNet_model(GANs_abstract_object.GANs_model):
                 N = real_batch.size(0)
                 if optimizer_name == 'GaussSeidel' or optimizer_name == 'Adam':
                     error_real, error_fake, g_error = self.optimizer.step(
-                        real_data, labels, N
+                        lambda: (real_data, labels, N)
                     )
                     self.D = self.optimizer.D
                     self.G = self.optimizer.G
                 else:
                     for i in np.arange(repeat_iterations):
-                        (
-                            error_real,
-                            error_fake,
-                            g_error,
-                            p_x,
-                            p_y,
-                        ) = self.optimizer.step(real_data, N)
-
-                        index = 0
-                        for p in self.G.parameters():
-                            p.data.add_(
-                                p_x[index : index + p.numel()].reshape(p.shape)
-                            )
-                            index += p.numel()
-                        if index != p_x.numel():
-                            raise RuntimeError('CG size mismatch')
-                        index = 0
-                        for p in self.D.parameters():
-                            p.data.add_(
-                                p_y[index : index + p.numel()].reshape(p.shape)
-                            )
-                            index += p.numel()
-                        if index != p_y.numel():
-                            raise RuntimeError('Size mismatch')
+                        error_real, error_fake, g_error = self.optimizer.step(
+                            lambda: (real_data, N)
+                        )
 
                 self.D_error_real_history.append(error_real)
                 self.D_error_fake_history.append(error_fake)
@@ -151,6 +134,7 @@ class ResNet_model(GANs_abstract_object.GANs_model):
                     )
                     self.save_images(e, n_batch, test_images)
 
+            self.flush_telemetry()
             self.print_verbose(
                 "######################################################"
             )
@@ -11,7 +11,7 @@
 
 Usage:
   main_GANS.py (-h | --help)
-  main_GANS.py [-c CONFIG_FILE] [-m MODEL] [-e EPOCHS] [-o OPTIMIZER] [-r LEARNING_RATE] [-d DATASET] [--display] [--save] [--list]
+  main_GANS.py [-c CONFIG_FILE] [-m MODEL] [-e EPOCHS] [-o OPTIMIZER] [-r LEARNING_RATE] [-d DATASET] [--display] [--save] [--list] [--telemetry=<dir>] [--parameter_arena]
 
 Options:
   -h, --help                  Show this screen.
@@ -25,6 +25,8 @@ Options:
   -o, --optimizer=<str>       Optimizer name [default: Jacobi].
   -r, --learning_rate=<f>     Learning rate [default: 0.01].
   -d, --dataset=<srt>         Datased used for training. MNIST, CIFAR10, CIFAR100 [default: CIFAR10]
+  --parameter_arena           Store the parameters of each player in one contiguous buffer.
+  --telemetry=<dir>           Record every linear solve of the optimizer in <dir>/solver_telemetry_MPI_rank_<rank>.jsonl.
 """
 
 from docopt import docopt
@@ -158,6 +160,8 @@ if __name__ == '__main__':
         label_smoothing=False,
         single_number=None,
         repeat_iterations=1,
+        telemetry_path=config['telemetry'],
+        parameter_arena=config['parameter_arena'],
     )  # save_path = ''
 
     mpi_comm_size = MPI.COMM_WORLD.Get_size()
@@ -18,6 +18,8 @@ Newton: Same algorithm but with pure essian term not set to identity
 '''
 
 import time
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
 import torch
 import numpy
 from torch import Tensor
@@ -30,118 +32,944 @@ from abc import ABCMeta, abstractmethod
 import math
 
 
-class Optimizer(object, metaclass=ABCMeta):
-    def __init__(self, G, D, criterion, model_name):
+class CompetitiveOptimizer(object, metaclass=ABCMeta):
+    # attributes saved by state_dict, extended by every algorithm
+    state_names = ('count',)
+
+    def __init__(self, G, D):
+        """
+        torch.optim-like interface of the two-player optimizers: one param
+        group per player, an in-place step(closure) and state_dict() /
+        load_state_dict() to checkpoint and resume a run. Subclasses
+        implement update, which returns the errors of the batch and either
+        the update vectors of both players or nothing once it has updated
+        the parameters itself.
+
+        :param G: generator, first player (x)
+        :param D: discriminator, second player (y)
+        """
+        self.param_groups = [
+            {'params': list(G.parameters()), 'lr': None},
+            {'params': list(D.parameters()), 'lr': None},
+        ]
         self.count = 0
+        # ParameterArena of each player, applying an update with one add_
+        self.arena_G = None
+        self.arena_D = None
+
+    @property
+    def lr_x(self):
+        return self.param_groups[0]['lr']
+
+    @lr_x.setter
+    def lr_x(self, lr):
+        self.param_groups[0]['lr'] = lr
+
+    @property
+    def lr_y(self):
+        return self.param_groups[1]['lr']
+
+    @lr_y.setter
+    def lr_y(self, lr):
+        self.param_groups[1]['lr'] = lr
+
+    @property
+    def lr(self):
+        '''
+        Learning rate of the algorithms sharing one rate between the players
+        '''
+        return self.param_groups[0]['lr']
+
+    @lr.setter
+    def lr(self, lr):
+        for group in self.param_groups:
+            group['lr'] = lr
+
+    @abstractmethod
+    def update(self, *batch):
+        pass
+
+    def apply_update(self, p_x, p_y):
+        '''
+        Adds the flattened updates p_x and p_y to the parameters in place
+        '''
+        for group, arena, vec in zip(
+            self.param_groups, (self.arena_G, self.arena_D), (p_x, p_y)
+        ):
+            if arena is not None:
+                arena.add_(vec)
+                continue
+            index = 0
+            for p in group['params']:
+                p.data.add_(vec[index : index + p.numel()].reshape(p.shape))
+                index += p.numel()
+            if index != vec.numel():
+                raise RuntimeError('size mismatch')
+
+    def step(self, closure):
+        """
+        Performs one step of the algorithm and updates the parameters of
+        both players in place.
+
+        :param closure: callable returning the arguments of update for the
+                        current batch, e.g. lambda: (real_data, N)
+        :return: error_real, error_fake, g_error
+        """
+        result = self.update(*closure())
+        if len(result) == 5:
+            self.apply_update(result[3], result[4])
+        return result[:3]
+
+    def state_dict(self):
+        """
+        State of the optimizer in the layout of torch.optim: 'state' holds
+        the attributes listed in state_names, 'param_groups' the
+        hyperparameters with the parameters replaced by their indices.
+        Solver caches (preconditioners, recycled subspaces, Nystrom
+        factors) are rebuilt after a restart and not saved.
+        """
+        state = {}
+        for name in self.state_names:
+            value = getattr(self, name)
+            if hasattr(value, 'state_dict'):
+                value = value.state_dict()
+            state[name] = value
+        param_groups = []
+        index = 0
+        for group in self.param_groups:
+            saved = {k: v for k, v in group.items() if k != 'params'}
+            saved['params'] = list(range(index, index + len(group['params'])))
+            index += len(group['params'])
+            param_groups.append(saved)
+        return {'state': state, 'param_groups': param_groups}
+
+    def load_state_dict(self, state_dict):
+        """
+        Restores a state returned by state_dict of the same algorithm on
+        the same models
+        """
+        param_groups = state_dict['param_groups']
+        if len(param_groups) != len(self.param_groups) or any(
+            len(saved['params']) != len(group['params'])
+            for saved, group in zip(param_groups, self.param_groups)
+        ):
+            raise RuntimeError(
+                'State dict does not match the parameters of the optimizer'
+            )
+        for saved, group in zip(param_groups, self.param_groups):
+            for k, v in saved.items():
+                if k != 'params':
+                    group[k] = v
+        for name, value in state_dict['state'].items():
+            current = getattr(self, name, None)
+            if hasattr(current, 'load_state_dict'):
+                current.load_state_dict(value)
+            else:
+                setattr(self, name, value)
+
+
+class Optimizer(CompetitiveOptimizer):
+    def __init__(self, G, D, criterion, model_name):
+        super(Optimizer, self).__init__(G, D)
         self.criterion = criterion
         self.D = D
         self.G = G
         self.model_name = model_name
         if self.model_name == 'ResNet':
-            self.target_1 = ones_target_resnet
-            self.target_0 = zeros_target_resnet
+            self.target_1 = 'ones_resnet'
+            self.target_0 = 'zeros_resnet'
             self.noise_dim = 128
         else:
-            self.target_1 = ones_target
-            self.target_0 = zeros_target
+            self.target_1 = 'ones'
+            self.target_0 = 'zeros'
             self.noise_dim = 100
         if self.model_name == 'CNN-CGANs' or self.model_name == 'C-GANs':
             self.conditional = True
         else:
             self.conditional = False
+        self.forward_mode = False
+        self.forward_mode_supported = None
+        self.solver = 'cg'
+        self.solver_steps = 20
+        # iterations between two host synchronizations of
+        # 'single_reduction_cg'
+        self.check_every = 5
+        # relative residual target of 'richardson', dtype-based if None
+        self.richardson_tol = None
+        self.eigenvectors = {}
+        self.recyclers = {}
+        self.recycle_size = 5
+        self.nystrom = {}
+        self.nystrom_rank = 20
+        self.nystrom_every = 10
+        self.sketch_memory = 2 ** 26
+        self.forcing = None
+        # fraction of the batch on which the mixed products run
+        self.curvature_fraction = None
+        self.monitor = HealthMonitor()
+        # SpectralEstimator updated with the operator of every step
+        self.spectrum = None
+        self.precision = None
+        self.solve_tolerance = None
+        self.solve_stats = None
+        # SolverTelemetry receiving a record of every CG solve
+        self.telemetry = None
+        # one forward pass of D on the real and fake batches, see discriminate
+        self.fuse_discriminator = False
+        # block-diagonal approximation of the CGD system, see block_pairs
+        self.blocks = None
+        self.parallel_blocks = False
+        self.iter_num = None
 
     def zero_grad(self):
         zero_grad(self.G.parameters())
         zero_grad(self.D.parameters())
 
-    @abstractmethod
-    def step(self, real_data, N):
-        pass
+    def functional_costs(self, generator_noise, real_data, N):
+        '''
+        Discriminator cost (error_real + error_fake) and generator cost of
+        the current batch as functions of the G and D parameters
+        '''
+        G_names = [name for name, _ in self.G.named_parameters()]
+        D_names = [name for name, _ in self.D.named_parameters()]
+        G_buffers = dict(self.G.named_buffers())
+        D_buffers = dict(self.D.named_buffers())
+        # fetched here: a target first cached inside a torch.func transform
+        # would escape it
+        ones_D = cached_target('ones', N, self.D.device)
+        zeros_D = cached_target('zeros', N, self.D.device)
+        ones_G = cached_target('ones', N, self.G.device)
+
+        def state(names, params, buffers):
+            # BatchNorm updates its running statistics in place, which
+            # torch.func forbids on captured tensors: every call gets its
+            # own copy, so the statistics are only updated by the step
+            state = {name: b.clone() for name, b in buffers.items()}
+            state.update(zip(names, params))
+            return state
+
+        def prediction_fake(x, y):
+            fake_data = functional_call(
+                self.G, state(G_names, x, G_buffers), (generator_noise,)
+            )
+            return functional_call(
+                self.D,
+                state(D_names, y, D_buffers),
+                (fake_data.to(self.D.device),),
+            )
 
+        def discriminator_cost(x, y):
+            prediction_real = functional_call(
+                self.D,
+                state(D_names, y, D_buffers),
+                (real_data.to(self.D.device),),
+            )
+            error_real = self.criterion(prediction_real, ones_D)
+            error_fake = self.criterion(prediction_fake(x, y), zeros_D)
+            return error_fake + error_real
 
-class CGD(Optimizer):
-    def __init__(self, G, D, criterion, model_name, lr=1e-3):
-        super(CGD, self).__init__(G, D, criterion, model_name)
-        self.lr = lr
+        def generator_cost(x, y):
+            return self.criterion(
+                prediction_fake(x, y).to(self.G.device), ones_G
+            )
 
-    def step(self, real_data, N):
-        fake_data = self.G(noise(N, 100).to(self.G.device))
-        prediction_real = self.D(real_data.to(self.D.device))
-        error_real = self.criterion(
-            prediction_real, ones_target(N).to(self.D.device)
+        return discriminator_cost, generator_cost
+
+    def forward_costs(self, generator_noise, real_data, N):
+        '''
+        Functional costs of the batch if the mixed products run
+        forward-over-reverse, None otherwise. The models are probed once and
+        reverse mode is used if they do not support torch.func.
+        '''
+        if not self.forward_mode or self.forward_mode_supported is False:
+            return None
+        costs = self.functional_costs(
+            *self.curvature_batch(generator_noise, real_data, N)
         )
-        prediction_fake = self.D(fake_data.to(self.D.device))
-        error_fake = self.criterion(
-            prediction_fake, zeros_target(N).to(self.D.device)
+        if self.forward_mode_supported is None:
+            try:
+                operator = self.mixed_hessian_operator(
+                    None, None, torch.ones(1), torch.ones(1), costs
+                )
+                operator.D_yx(torch.zeros(operator.n_x))
+                self.forward_mode_supported = True
+            except Exception as error:
+                print(
+                    'Forward-mode Hessian products not supported by '
+                    + type(self.G).__name__
+                    + '/'
+                    + type(self.D).__name__
+                    + ', falling back to reverse mode: '
+                    + type(error).__name__
+                    + ': '
+                    + str(error)
+                )
+                self.forward_mode_supported = False
+                return None
+        return costs
+
+    def discriminate(self, real_data, fake_data):
+        '''
+        Predictions of D on the real and on the fake batch. With
+        self.fuse_discriminator, from a single forward pass on the two
+        batches concatenated, whose BatchNorm layers still normalize each
+        batch with its own statistics (split_batch_norm).
+        '''
+        real_data = real_data.to(self.D.device)
+        fake_data = fake_data.to(self.D.device)
+        if not self.fuse_discriminator:
+            return self.D(real_data), self.D(fake_data)
+        N = real_data.shape[0]
+        with split_batch_norm(self.D, N):
+            prediction = self.D(torch.cat([real_data, fake_data]))
+        return prediction[:N], prediction[N:]
+
+    def joint_gradients(self, loss, create_graph=True, allow_unused=False):
+        '''
+        Gradients of loss with respect to the parameters of G and of D from
+        a single backward pass over both parameter lists
+
+        :return: gradients of the G parameters, gradients of the D parameters
+        '''
+        x_params = list(self.G.parameters())
+        y_params = list(self.D.parameters())
+        grads = autograd.grad(
+            loss,
+            x_params + y_params,
+            create_graph=create_graph,
+            retain_graph=True,
+            allow_unused=allow_unused,
         )
-        error_tot = error_fake + error_real
-        errorG = self.criterion(
-            prediction_fake.to(self.G.device),
-            ones_target(N).to(self.G.device),
+        return grads[: len(x_params)], grads[len(x_params) :]
+
+    def curvature_batch(self, generator_noise, real_data, N):
+        '''
+        First self.curvature_fraction of the batch, the whole batch if None
+        '''
+        if self.curvature_fraction is None:
+            return generator_noise, real_data, N
+        M = max(1, int(round(self.curvature_fraction * N)))
+        return generator_noise[:M], real_data[:M], M
+
+    def curvature_gradients(
+        self, generator_noise, real_data, N, costs=None, multi_cost=False
+    ):
+        '''
+        Gradients of G (x) and D (y), with their graph, on the sub-batch of
+        curvature_batch: the mixed products then differentiate this smaller
+        graph (subsampled curvature) while the full batch gradients need no
+        graph. None without self.curvature_fraction or if the products run
+        forward-over-reverse on costs, which are subsampled already.
+
+        :param multi_cost: gradient of D from the generator cost instead of
+                           the discriminator cost (CGDMultiCost)
+        '''
+        if self.curvature_fraction is None or costs is not None:
+            return None
+        # functional_costs runs on copies of the BatchNorm buffers: the
+        # sub-batch pass leaves the running statistics to the full batch
+        discriminator_cost, generator_cost = self.functional_costs(
+            *self.curvature_batch(generator_noise, real_data, N)
         )
+        x_params = list(self.G.parameters())
+        y_params = list(self.D.parameters())
+        cost_y = generator_cost if multi_cost else discriminator_cost
         grad_x = autograd.grad(
-            error_tot,
-            self.G.parameters(),
+            discriminator_cost(x_params, y_params),
+            x_params,
             create_graph=True,
             retain_graph=True,
-            allow_unused=True,
         )
-        grad_x_vec = torch.cat([g.contiguous().view(-1) for g in grad_x])
         grad_y = autograd.grad(
-            error_tot,
-            self.D.parameters(),
+            cost_y(x_params, y_params),
+            y_params,
             create_graph=True,
             retain_graph=True,
         )
-        grad_y_vec = torch.cat([g.contiguous().view(-1) for g in grad_y])
+        return (
+            torch.cat([g.contiguous().view(-1) for g in grad_x]),
+            torch.cat([g.contiguous().view(-1) for g in grad_y]),
+        )
+
+    def autocast(self):
+        '''
+        Autocast of self.precision on the devices of G and D, a no-op
+        without a PrecisionPolicy
+        '''
+        stack = contextlib.ExitStack()
+        if self.precision is not None:
+            for device in {
+                torch.device(self.G.device).type,
+                torch.device(self.D.device).type,
+            }:
+                stack.enter_context(self.precision.autocast(device))
+        return stack
+
+    def scale_loss(self, loss):
+        if self.precision is None:
+            return loss
+        return self.precision.scale(loss)
+
+    def unscale_grad(self, grad_vec):
+        if self.precision is None:
+            return grad_vec
+        return self.precision.unscale(grad_vec)
+
+    def full_precision_step(self, *args):
+        '''
+        Redoes the step without autocast after non-finite gradients
+        '''
+        print('Non-finite gradients, redoing the step in full precision')
+        self.precision.enabled = False
+        try:
+            return self.update(*args)
+        finally:
+            self.precision.enabled = True
+
+    def mixed_hessian_operator(
+        self,
+        grad_x,
+        grad_y,
+        lr_x,
+        lr_y,
+        costs=None,
+        curvature=None,
+        transpose=False,
+    ):
+        '''
+        MixedHessianOperator of G (x) and D (y); with costs = (cost_x,
+        cost_y) from functional_costs the products run forward-over-reverse,
+        with curvature from curvature_gradients they differentiate the
+        sub-batch gradients instead of grad_x and grad_y. With transpose,
+        the operator of the same game seen from D, built directly: D then
+        plays x with lr_x and G plays y with lr_y.
+        '''
+        x_params, y_params = self.G.parameters(), self.D.parameters()
+        device_x, device_y = self.G.device, self.D.device
+        if costs is not None:
+            cost_x, cost_y = costs
+            if transpose:
+                cost_x, cost_y = (
+                    lambda y, x: costs[1](x, y),
+                    lambda y, x: costs[0](x, y),
+                )
+        else:
+            cost_x = grad_x if curvature is None else curvature[0]
+            cost_y = grad_y if curvature is None else curvature[1]
+            if transpose:
+                cost_x, cost_y = cost_y, cost_x
+        if transpose:
+            x_params, y_params = y_params, x_params
+            device_x, device_y = device_y, device_x
+        if costs is not None:
+            operator = ForwardMixedHessianOperator(
+                cost_x,
+                cost_y,
+                x_params,
+                y_params,
+                lr_x,
+                lr_y,
+                device_x=device_x,
+                device_y=device_y,
+            )
+        else:
+            operator = MixedHessianOperator(
+                cost_x,
+                cost_y,
+                x_params,
+                y_params,
+                lr_x,
+                lr_y,
+                device_x=device_x,
+                device_y=device_y,
+            )
+        # the gradients of a transposed operator are recorded already
+        if grad_x is not None and not transpose:
+            self.monitor.record('grad_x', grad_x)
+            self.monitor.record('grad_y', grad_y)
+        operator.monitor = self.monitor
+        return operator
+
+    def build_preconditioner(self, precondition, refresh):
+        '''
+        CG preconditioner selected by precondition: True or 'hutchinson' for
+        the diagonal estimate, 'gaussian' or 'srht' for the randomized
+        Nystrom preconditioner of rank at most self.nystrom_rank whose
+        factor fits in self.sketch_memory bytes. Only the CG solvers take
+        it: with another solver, its Hessian products would be spent for
+        nothing at every step.
+        '''
+        if self.solver != 'cg' and self.solver != 'single_reduction_cg':
+            raise RuntimeError(
+                'Only the cg and single_reduction_cg solvers take a '
+                'preconditioner'
+            )
+        if precondition is True or precondition == 'hutchinson':
+            return HutchinsonPreconditioner(refresh=refresh)
+        elif precondition == 'gaussian' or precondition == 'srht':
+            return SketchPreconditioner(
+                rank=self.nystrom_rank,
+                refresh=refresh,
+                sketch=precondition,
+                memory_budget=self.sketch_memory,
+            )
+        else:
+            raise RuntimeError('Preconditioner type is not valid')
+
+    def block_pairs(self):
+        '''
+        (G parameter indices, D parameter indices) of the blocks of
+        self.blocks: 'layers' pairs the layers of G and D found by
+        module_blocks, otherwise self.blocks is a list of (G parameters,
+        D parameters) partitioning the parameters of both players
+        '''
+        if self.blocks == 'layers':
+            pairs = pair_blocks(module_blocks(self.G), module_blocks(self.D))
+        else:
+            pairs = self.blocks
+        G_index = {id(p): i for i, p in enumerate(self.G.parameters())}
+        D_index = {id(p): i for i, p in enumerate(self.D.parameters())}
+        indices = [
+            (
+                [G_index.get(id(p)) for p in x_params],
+                [D_index.get(id(p)) for p in y_params],
+            )
+            for x_params, y_params in pairs
+        ]
+        for index, size in (
+            ([i for ix, _ in indices for i in ix], len(G_index)),
+            ([i for _, iy in indices for i in iy], len(D_index)),
+        ):
+            if None in index or sorted(index) != list(range(size)):
+                raise RuntimeError(
+                    'Blocks must partition the parameters of G and D'
+                )
+        return indices
+
+    def block_diagonal_solve(self, grad_x, grad_y, lr_x, lr_y):
+        '''
+        CGD update with the interaction restricted to the block pairs of
+        block_pairs: one smaller system, solved by CG, per pair, the pairs
+        in threads with self.parallel_blocks. self.iter_num gets the CG
+        iterations of every block. Each pair records into its own
+        HealthMonitor, merged into self.monitor once the pairs are solved.
+
+        :param grad_x: gradients of the G parameters, with graph
+        :param grad_y: gradients of the D parameters, with graph
+        :return: delta x, delta y
+        '''
+        x_params = list(self.G.parameters())
+        y_params = list(self.D.parameters())
+        lr_x = lr_x.to(self.G.device)
+        lr_y = lr_y.to(self.D.device)
+        n_x = sum(p.numel() for p in x_params)
+        guess = self.warm_start_x.guess(lr_x, n_x, self.G.device)
+        starts = numpy.cumsum([0] + [p.numel() for p in x_params])
+
+        def flat(grads, params, index):
+            return torch.cat(
+                [
+                    torch.zeros_like(params[i]).view(-1)
+                    if grads[i] is None
+                    else grads[i].contiguous().view(-1)
+                    for i in index
+                ]
+            )
+
+        def solve(pair):
+            ix, iy = pair
+            grad_x_vec = flat(grad_x, x_params, ix)
+            grad_y_vec = flat(grad_y, y_params, iy)
+            operator = MixedHessianOperator(
+                grad_x_vec,
+                grad_y_vec,
+                [x_params[i] for i in ix],
+                [y_params[i] for i in iy],
+                lr_x,
+                lr_y,
+                device_x=self.G.device,
+                device_y=self.D.device,
+            )
+            # HealthMonitor.record is not thread-safe
+            operator.monitor = HealthMonitor()
+            p_x = torch.add(
+                grad_x_vec, -operator.D_xy(lr_y * grad_y_vec)
+            ).detach_()  # grad_x - D_xy * lr_y * grad_y
+            p_x.mul_(lr_x.sqrt())
+            x = None
+            if guess is not None:
+                x = torch.cat([guess[starts[i] : starts[i + 1]] for i in ix])
+            solution, iterations = conjugate_gradient(
+                operator,
+                p_x,
+                x=x,
+                nsteps=p_x.shape[0],
+                telemetry=self.telemetry,
+            )
+            solution.detach_()
+            # grad_y + D_yx * delta x
+            hcg = torch.add(
+                operator.D_yx(lr_x.sqrt() * solution), grad_y_vec
+            ).detach_()
+            return solution, hcg.mul(-lr_y), iterations, operator.monitor
+
+        pairs = self.block_pairs()
+        if self.parallel_blocks:
+            with ThreadPoolExecutor(max_workers=len(pairs)) as pool:
+                results = list(pool.map(solve, pairs))
+        else:
+            results = [solve(pair) for pair in pairs]
+
+        pieces_x = [None] * len(x_params)
+        pieces_y = [None] * len(y_params)
+        for (ix, iy), (solution, cg_y, _, monitor) in zip(pairs, results):
+            self.monitor.merge(monitor)
+            sizes_x = [x_params[i].numel() for i in ix]
+            sizes_y = [y_params[i].numel() for i in iy]
+            for i, piece in zip(ix, torch.split(solution, sizes_x)):
+                pieces_x[i] = piece
+            for i, piece in zip(iy, torch.split(cg_y, sizes_y)):
+                pieces_y[i] = piece
+        solution = torch.cat(pieces_x)
+        self.warm_start_x.update(solution)
+        self.iter_num = tuple(result[2] for result in results)
+        return solution.mul(lr_x.sqrt()), torch.cat(pieces_y)
+
+    def spectral_bound(self, operator):
+        '''
+        Upper bound of the spectrum of operator for 'chebyshev', 'neumann'
+        and 'richardson': 1.1 times the power iteration estimate. Power
+        iteration restarted from the eigenvector of the last step tightens
+        the estimate over training; an underestimate makes these solvers
+        diverge, so a cold start runs longer.
+        '''
+        vec = self.eigenvectors.get(operator.n_x)
+        lambda_max, self.eigenvectors[operator.n_x] = largest_eigenvalue(
+            operator, n_iterations=5 if vec is not None else 20, vec=vec
+        )
+        return 1.1 * lambda_max
+
+    def competitive_solve(
+        self,
+        operator,
+        kk,
+        x,
+        nsteps,
+        preconditioner=None,
+        grad_x=None,
+        grad_y=None,
+    ):
+        '''
+        operator ** -1 * kk with the solver selected by self.solver; nsteps
+        caps the iterations of CG, fixed-cost solvers run self.solver_steps.
+        With self.forcing, the CG tolerance follows the norm of grad_x and
+        grad_y. The relative residual target and the iteration count are
+        kept in self.solve_tolerance and self.iter_num.
+        'single_reduction_cg' merges the inner products of a CG iteration
+        into one reduction and tests convergence, a host synchronization,
+        every self.check_every iterations only; the iterations past
+        convergence are no-ops on the device.
+        'neumann' sums self.solver_steps terms of the Neumann series of the
+        system when its estimated spectral radius allows it, CG otherwise.
+        'richardson' runs at most self.solver_steps Richardson sweeps with
+        the optimal relaxation for the spectrum [1, lambda_max], a cheap
+        smoother, down to a relative residual of self.richardson_tol (10
+        machine epsilons of kk if None); the statistics of the solve are
+        kept in self.solve_stats.
+        'recycled_cg' deflates CG with the approximate eigenvectors kept from
+        the previous solves of the same system; it takes no preconditioner.
+        'nystrom' solves with a low-rank approximation of the system built
+        every self.nystrom_every steps, self.iter_num then counts the
+        operator applications of the step.
+        With self.precision, the solve runs in its solve_dtype.
+        '''
+        dtype = kk.dtype
+        if self.precision is not None:
+            kk = kk.to(self.precision.solve_dtype)
+            if x is not None:
+                x = x.to(self.precision.solve_dtype)
+        residual_tol = 1e-16
+        time_budget = None
+        self.solve_tolerance = math.sqrt(residual_tol)
+        if self.forcing is not None and grad_x is not None:
+            self.solve_tolerance = self.forcing.tolerance(grad_x, grad_y)
+            residual_tol = self.solve_tolerance ** 2
+            nsteps = min(nsteps, self.forcing.max_iterations)
+            time_budget = self.forcing.time_budget
+
+        if self.solver == 'cg' or self.solver == 'single_reduction_cg':
+            if self.solver == 'cg':
+                solve = conjugate_gradient
+                options = {}
+            else:
+                solve = single_reduction_conjugate_gradient
+                options = {'check_every': self.check_every}
+            solution, self.iter_num = solve(
+                operator,
+                kk,
+                x=x,
+                nsteps=nsteps,
+                residual_tol=residual_tol,
+                preconditioner=preconditioner,
+                time_budget=time_budget,
+                telemetry=self.telemetry,
+                **options
+            )
+        elif self.solver == 'chebyshev':
+            solution, self.iter_num, converged = chebyshev(
+                operator,
+                kk,
+                x=x,
+                nsteps=self.solver_steps,
+                lambda_max=self.spectral_bound(operator),
+            )
+            if not converged:
+                # the spectral bound failed through every restart
+                print('Chebyshev did not converge, solving with CG')
+                solution, iterations = conjugate_gradient(
+                    operator,
+                    kk,
+                    x=x,
+                    nsteps=nsteps,
+                    residual_tol=residual_tol,
+                    preconditioner=preconditioner,
+                    time_budget=time_budget,
+                    telemetry=self.telemetry,
+                )
+                self.iter_num += iterations
+        elif self.solver == 'neumann':
+            # the series converges if the largest eigenvalue of
+            # A = operator - I is below 1, i.e. 1.1 * (lambda_max - 1) < 1
+            if self.spectral_bound(operator) < 2.1:
+                solution, self.iter_num = neumann_series(
+                    operator, kk, x=x, nsteps=self.solver_steps
+                )
+            else:
+                solution, self.iter_num = conjugate_gradient(
+                    operator,
+                    kk,
+                    x=x,
+                    nsteps=nsteps,
+                    residual_tol=residual_tol,
+                    preconditioner=preconditioner,
+                    time_budget=time_budget,
+                    telemetry=self.telemetry,
+                )
+        elif self.solver == 'richardson':
+            # a relative residual below the precision of kk is out of reach
+            self.solve_tolerance = max(
+                self.solve_tolerance,
+                self.richardson_tol or 10 * torch.finfo(kk.dtype).eps,
+            )
+            richardson = Richardson(
+                operator.matvec,
+                kk.detach().to(operator.device_x),
+                tol=self.solve_tolerance,
+                maxiter=self.solver_steps,
+                lambda_min=1.0,
+                lambda_max=self.spectral_bound(operator),
+            )
+            solution = richardson.solve(
+                None if x is None else x.to(operator.device_x)
+            )
+            self.solve_stats = richardson.stats
+            self.iter_num = richardson.iteration_count
+        elif self.solver == 'recycled_cg':
+            key = (operator.n_x, operator.n_y)
+            if key not in self.recyclers:
+                self.recyclers[key] = KrylovRecycler(
+                    k=self.recycle_size, m=2 * self.recycle_size
+                )
+            solution, self.iter_num = deflated_conjugate_gradient(
+                operator,
+                kk,
+                self.recyclers[key],
+                x=x,
+                nsteps=nsteps,
+                residual_tol=residual_tol,
+                time_budget=time_budget,
+            )
+        elif self.solver == 'nystrom':
+            key = (operator.n_x, operator.n_y)
+            if key not in self.nystrom:
+                self.nystrom[key] = NystromApproximation(
+                    rank=self.nystrom_rank, refresh=self.nystrom_every
+                )
+            self.iter_num = self.nystrom[key].update(operator)
+            solution = self.nystrom[key].apply(kk.detach())
+        else:
+            raise RuntimeError('Solver type is not valid')
+        return solution.to(dtype), self.iter_num
+
+
+class CGD(Optimizer):
+    state_names = ('count', 'warm_start_x')
+
+    def __init__(
+        self,
+        G,
+        D,
+        criterion,
+        model_name,
+        lr=1e-3,
+        warm_start=True,
+        extrapolate=False,
+        precondition=False,
+        precondition_every=10,
+        forward_mode=False,
+        solver='cg',
+        solver_steps=20,
+        check_every=5,
+        richardson_tol=None,
+        forcing=None,
+        recycle_size=5,
+        nystrom_rank=20,
+        nystrom_every=10,
+        sketch_memory=2 ** 26,
+        precision=None,
+        curvature_fraction=None,
+        blocks=None,
+        parallel_blocks=False,
+    ):
+        super(CGD, self).__init__(G, D, criterion, model_name)
+        self.lr = lr
+        self.forward_mode = forward_mode
+        self.solver = solver
+        self.solver_steps = solver_steps
+        self.check_every = check_every
+        self.richardson_tol = richardson_tol
+        self.forcing = forcing
+        self.recycle_size = recycle_size
+        self.nystrom_rank = nystrom_rank
+        self.nystrom_every = nystrom_every
+        self.sketch_memory = sketch_memory
+        self.precision = precision
+        self.curvature_fraction = curvature_fraction
+        self.blocks = blocks
+        self.parallel_blocks = parallel_blocks
+        if blocks is not None and (
+            forward_mode
+            or curvature_fraction is not None
+            or precision is not None
+        ):
+            raise RuntimeError(
+                'Block-diagonal CGD takes reverse-mode products on the full '
+                'batch in full precision'
+            )
+        self.warm_start_x = WarmStart(warm_start, extrapolate)
+        self.preconditioner_x = None
+        if precondition:
+            self.preconditioner_x = self.build_preconditioner(
+                precondition, precondition_every
+            )
+
+    def update(self, real_data, N):
+        generator_noise = noise(N, 100).to(self.G.device)
+        with self.autocast():
+            fake_data = self.G(generator_noise)
+            prediction_real, prediction_fake = self.discriminate(
+                real_data, fake_data
+            )
+            error_real = self.criterion(
+                prediction_real, cached_target('ones', N, self.D.device)
+            )
+            error_fake = self.criterion(
+                prediction_fake, cached_target('zeros', N, self.D.device)
+            )
+            error_tot = error_fake + error_real
+            errorG = self.criterion(
+                prediction_fake.to(self.G.device),
+                cached_target('ones', N, self.G.device),
+            )
+        costs = self.forward_costs(generator_noise, real_data, N)
+        curvature = self.curvature_gradients(
+            generator_noise, real_data, N, costs
+        )
+        grad_x, grad_y = self.joint_gradients(
+            self.scale_loss(error_tot),
+            create_graph=costs is None and curvature is None,
+            allow_unused=True,
+        )
+        grad_x_vec = self.unscale_grad(
+            torch.cat([g.contiguous().view(-1) for g in grad_x])
+        )
+        grad_y_vec = self.unscale_grad(
+            torch.cat([g.contiguous().view(-1) for g in grad_y])
+        )
+        if self.precision is not None and not self.precision.check(
+            grad_x_vec, grad_y_vec
+        ):
+            return self.full_precision_step(real_data, N)
+        if self.blocks is not None:
+            cg_x, cg_y = self.block_diagonal_solve(
+                grad_x, grad_y, self.lr, self.lr
+            )
+            self.monitor.check()
+            return (
+                error_real.item(),
+                error_fake.item(),
+                errorG.item(),
+                cg_x,
+                cg_y,
+            )
         scaled_grad_x = torch.mul(self.lr.to(self.G.device), grad_x_vec)
         scaled_grad_y = torch.mul(self.lr.to(self.D.device), grad_y_vec)
         # l = autograd.grad(grad_x_vec, discriminator.parameters(), grad_outputs = torch.ones_like(grad_x_vec))
+        operator = self.mixed_hessian_operator(
+            grad_x_vec,
+            grad_y_vec,
+            self.lr,
+            self.lr,
+            None if costs is None else (costs[0], costs[0]),
+            curvature,
+        )
+        if self.spectrum is not None:
+            self.spectrum.update(operator)
 
-        hvp_x_vec = Hvp_vec(
-            grad_y_vec, self.G.parameters(), scaled_grad_y, retain_graph=True
-        )  # D_xy * lr_y * grad_y
-        hvp_y_vec = Hvp_vec(
-            grad_x_vec, self.D.parameters(), scaled_grad_x, retain_graph=True
-        )  # D_yx * lr_x * grad_x
+        hvp_x_vec = operator.D_xy(scaled_grad_y)  # D_xy * lr_y * grad_y
         p_x = torch.add(
             grad_x_vec, -hvp_x_vec
         ).detach_()  # grad_x - D_xy * lr_y * grad_y
+        hvp_y_vec = operator.D_yx(scaled_grad_x)  # D_yx * lr_x * grad_x
         p_y = torch.add(
             grad_y_vec, hvp_y_vec
         ).detach_()  # grad_y + D_yx * lr_x * grad_x
         p_x.mul_(self.lr.sqrt().to(self.G.device))
-        cg_x, iter_num = general_conjugate_gradient(
-            grad_x=grad_x_vec,
-            grad_y=grad_y_vec.to(self.G.device),
-            x_params=self.G.parameters(),
-            y_params=self.D.parameters(),
-            kk=p_x,
-            x=None,
+        if self.preconditioner_x is not None:
+            self.preconditioner_x.update(operator)
+        cg_x, iter_num = self.competitive_solve(
+            operator,
+            p_x,
+            self.warm_start_x.guess(self.lr, p_x.shape[0], self.G.device),
             nsteps=p_x.shape[0],
-            lr_x=self.lr,
-            lr_y=self.lr,
-            device_x=self.G.device,
-            device_y=self.D.device,
+            preconditioner=self.preconditioner_x,
+            grad_x=grad_x_vec,
+            grad_y=grad_y_vec,
         )
+        self.warm_start_x.update(cg_x)
 
         # cg_x.detach_().mul_(p_x_norm)
         # cg_x.detach_().mul_(p_x_norm)
         cg_x.detach_().mul_(
             self.lr.sqrt().to(self.G.device)
         )  # delta x = lr_x.sqrt() * cg_x
-        hcg = (
-            Hvp_vec(grad_x_vec, self.D.parameters(), cg_x, retain_graph=True)
-            .add_(grad_y_vec)
-            .detach_()
-        )
+        hcg = torch.add(operator.D_yx(cg_x), grad_y_vec).detach_()
         # grad_y + D_yx * delta x
         cg_y = hcg.mul(-self.lr.to(self.D.device))
 
+        self.monitor.check()
         return error_real.item(), error_fake.item(), errorG.item(), cg_x, cg_y
 
 
 class CGD_shafer(Optimizer):
+    state_names = (
+        'count',
+        'square_avgx',
+        'square_avgy',
+        'warm_start_x',
+        'warm_start_y',
+    )
+
     def __init__(
         self,
         G,
@@ -152,11 +980,41 @@ class CGD_shafer(Optimizer):
         beta2=0.99,
         lr=1e-3,
         solve_x=False,
+        warm_start=True,
+        extrapolate=False,
+        precondition=False,
+        precondition_every=10,
+        forward_mode=False,
+        solver='cg',
+        solver_steps=20,
+        check_every=5,
+        richardson_tol=None,
+        forcing=None,
+        recycle_size=5,
+        nystrom_rank=20,
+        nystrom_every=10,
+        sketch_memory=2 ** 26,
+        precision=None,
+        curvature_fraction=None,
+        joint_solve=False,
     ):
         super(CGD_shafer, self).__init__(G, D, criterion, model_name)
         self.G_params = list(G.parameters())
         self.D_params = list(D.parameters())
         self.lr = lr
+        self.forward_mode = forward_mode
+        self.solver = solver
+        self.solver_steps = solver_steps
+        self.check_every = check_every
+        self.richardson_tol = richardson_tol
+        self.forcing = forcing
+        self.recycle_size = recycle_size
+        self.nystrom_rank = nystrom_rank
+        self.nystrom_every = nystrom_every
+        self.sketch_memory = sketch_memory
+        self.precision = precision
+        self.curvature_fraction = curvature_fraction
+        self.joint_solve = joint_solve
         self.square_avgx = None
         self.square_avgy = None
         self.beta2 = beta2
@@ -164,30 +1022,56 @@ class CGD_shafer(Optimizer):
         self.cg_x = None
         self.cg_y = None
         self.count = 0
-        self.old_x = None
-        self.old_y = None
+        self.warm_start_x = WarmStart(warm_start, extrapolate)
+        self.warm_start_y = WarmStart(warm_start, extrapolate)
         self.solve_x = solve_x
+        self.preconditioner_x = None
+        self.preconditioner_y = None
+        if precondition:
+            self.preconditioner_x = self.build_preconditioner(
+                precondition, precondition_every
+            )
+            self.preconditioner_y = self.build_preconditioner(
+                precondition, precondition_every
+            )
 
-    def step(self, real_data, N):
+    def update(self, real_data, N):
         self.count += 1
         generator_noise = noise(N, 100).to(self.G.device)
-        fake_data = self.G(
-            generator_noise
-        )  # Second argument of noise is the noise_dimension parameter of build_generator
-        d_pred_real = self.D(real_data)
-        error_real = self.criterion(d_pred_real, ones_target(N))
-        d_pred_fake = self.D(fake_data)
-        error_fake = self.criterion(d_pred_fake, zeros_target(N))
-        g_error = self.criterion(d_pred_fake, ones_target(N))
-        loss = error_fake + error_real
-        grad_x = autograd.grad(
-            loss, self.G_params, create_graph=True, retain_graph=True
+        with self.autocast():
+            fake_data = self.G(
+                generator_noise
+            )  # Second argument of noise is the noise_dimension parameter of build_generator
+            d_pred_real, d_pred_fake = self.discriminate(real_data, fake_data)
+            error_real = self.criterion(
+                d_pred_real, cached_target('ones', N, self.D.device)
+            )
+            error_fake = self.criterion(
+                d_pred_fake, cached_target('zeros', N, self.D.device)
+            )
+            g_error = self.criterion(
+                d_pred_fake, cached_target('ones', N, self.D.device)
+            )
+            loss = error_fake + error_real
+        costs = self.forward_costs(generator_noise, real_data, N)
+        curvature = self.curvature_gradients(
+            generator_noise, real_data, N, costs
         )
-        grad_x_vec = torch.cat([g.contiguous().view(-1) for g in grad_x])
-        grad_y = autograd.grad(
-            loss, self.D_params, create_graph=True, retain_graph=True
+        grad_x, grad_y = self.joint_gradients(
+            self.scale_loss(loss),
+            create_graph=costs is None and curvature is None,
         )
-        grad_y_vec = torch.cat([g.contiguous().view(-1) for g in grad_y])
+        grad_x_vec = self.unscale_grad(
+            torch.cat([g.contiguous().view(-1) for g in grad_x])
+        )
+        grad_y_vec = self.unscale_grad(
+            torch.cat([g.contiguous().view(-1) for g in grad_y])
+        )
+        if self.precision is not None and not self.precision.check(
+            grad_x_vec, grad_y_vec
+        ):
+            self.count -= 1
+            return self.full_precision_step(real_data, N)
 
         if self.square_avgx is None and self.square_avgy is None:
             self.square_avgx = torch.zeros(
@@ -219,75 +1103,88 @@ class CGD_shafer(Optimizer):
 
         scaled_grad_x = torch.mul(lr_x, grad_x_vec).detach()  # lr_x * grad_x
         scaled_grad_y = torch.mul(lr_y, grad_y_vec).detach()  # lr_y * grad_y
+        operator = self.mixed_hessian_operator(
+            grad_x_vec,
+            grad_y_vec,
+            lr_x,
+            lr_y,
+            None if costs is None else (costs[0], costs[0]),
+            curvature,
+        )
+        if self.spectrum is not None:
+            self.spectrum.update(operator)
 
-        hvp_x_vec = Hvp_vec(
-            grad_y_vec, self.G_params, scaled_grad_y, retain_graph=True
-        )  # D_xy * lr_y * grad_y
-        hvp_y_vec = Hvp_vec(
-            grad_x_vec, self.D_params, scaled_grad_x, retain_graph=True
-        )  # D_yx * lr_x * grad_x
-
+        hvp_x_vec = operator.D_xy(scaled_grad_y)  # D_xy * lr_y * grad_y
         p_x = torch.add(
             grad_x_vec, -hvp_x_vec
         ).detach_()  # grad_x - D_xy * lr_y * grad_y
+        hvp_y_vec = operator.D_yx(scaled_grad_x)  # D_yx * lr_x * grad_x
         p_y = torch.add(
             grad_y_vec, hvp_y_vec
         ).detach_()  # grad_y + D_yx * lr_x * grad_x
 
-        if self.solve_x:
+        # one CG iteration per 10000 parameters, and at least one
+        if self.joint_solve:
+            p_x.mul_(lr_x.sqrt())
             p_y.mul_(lr_y.sqrt())
-            # p_y_norm = p_y.norm(p=2).detach_()
-            # if self.old_y is not None:
-            #     self.old_y = self.old_y / p_y_norm
-            cg_y, self.iter_num = general_conjugate_gradient(
-                grad_x=grad_y_vec,
-                grad_y=grad_x_vec,
-                x_params=self.D_params,
-                y_params=self.G_params,
-                kk=p_y,
-                x=self.old_y,
-                nsteps=p_y.shape[0] // 10000,
-                lr_x=lr_y,
-                lr_y=lr_x,
+            cg_x, cg_y, iter_x, iter_y = joint_conjugate_gradient(
+                operator,
+                operator.transpose(),
+                p_x,
+                p_y,
+                x=self.warm_start_x.guess(self.lr, p_x.shape[0]),
+                y=self.warm_start_y.guess(self.lr, p_y.shape[0]),
+                nsteps=max(1, max(p_x.shape[0], p_y.shape[0]) // 10000),
             )
-            # cg_y.mul_(p_y_norm)
+            self.iter_num = (iter_x, iter_y)
+            self.warm_start_x.update(cg_x)
+            self.warm_start_y.update(cg_y)
+            cg_x.detach_().mul_(lr_x.sqrt())  # delta x = lr_x.sqrt() * cg_x
             cg_y.detach_().mul_(-lr_y.sqrt())
-            hcg = (
-                Hvp_vec(grad_y_vec, self.G_params, cg_y, retain_graph=True)
-                .add_(grad_x_vec)
-                .detach_()
+        elif self.solve_x:
+            p_y.mul_(lr_y.sqrt())
+            operator_y = operator.transpose()
+            if self.preconditioner_y is not None:
+                self.preconditioner_y.update(operator_y)
+            cg_y, self.iter_num = self.competitive_solve(
+                operator_y,
+                p_y,
+                self.warm_start_y.guess(self.lr, p_y.shape[0]),
+                nsteps=max(1, p_y.shape[0] // 10000),
+                preconditioner=self.preconditioner_y,
+                grad_x=grad_x_vec,
+                grad_y=grad_y_vec,
             )
+            self.warm_start_y.update(cg_y)
+            # cg_y.mul_(p_y_norm)
+            cg_y.detach_().mul_(-lr_y.sqrt())
+            hcg = torch.add(operator.D_xy(cg_y), grad_x_vec).detach_()
             # grad_x + D_xy * delta y
             cg_x = hcg.mul(lr_x)
-            self.old_x = hcg.mul(lr_x.sqrt())
+            self.warm_start_x.update(hcg.mul(lr_x.sqrt()))
         else:
 
             p_x.mul_(lr_x.sqrt())
-            # p_x_norm = p_x.norm(p=2).detach_()
-            # if self.old_x is not None:
-            #     self.old_x = self.old_x / p_x_norm
-            cg_x, self.iter_num = general_conjugate_gradient(
+            if self.preconditioner_x is not None:
+                self.preconditioner_x.update(operator)
+            cg_x, self.iter_num = self.competitive_solve(
+                operator,
+                p_x,
+                self.warm_start_x.guess(self.lr, p_x.shape[0]),
+                nsteps=max(1, p_x.shape[0] // 10000),
+                preconditioner=self.preconditioner_x,
                 grad_x=grad_x_vec,
                 grad_y=grad_y_vec,
-                x_params=self.G_params,
-                y_params=self.D_params,
-                kk=p_x,
-                x=self.old_x,
-                nsteps=p_x.shape[0] // 10000,
-                lr_x=lr_x,
-                lr_y=lr_y,
             )
+            self.warm_start_x.update(cg_x)
             # cg_x.detach_().mul_(p_x_norm)
             cg_x.detach_().mul_(lr_x.sqrt())  # delta x = lr_x.sqrt() * cg_x
-            hcg = (
-                Hvp_vec(grad_x_vec, self.D_params, cg_x, retain_graph=True)
-                .add_(grad_y_vec)
-                .detach_()
-            )
+            hcg = torch.add(operator.D_yx(cg_x), grad_y_vec).detach_()
             # grad_y + D_yx * delta x
             cg_y = hcg.mul(-lr_y)
-            self.old_y = hcg.mul(lr_y.sqrt())
+            self.warm_start_y.update(hcg.mul(lr_y.sqrt()))
 
+        self.monitor.check()
         return (
             error_real.item(),
             error_fake.item(),
@@ -316,51 +1213,55 @@ class Jacobi(Optimizer):
         self.lr_y = lr_y
         self.label_smoothing = label_smoothing
 
-    def step(self, real_data, N):
+    def update(self, real_data, N):
         # Second argument of noise is the noise_dimension parameter of build_generator
         fake_data = self.G(noise(N, 100).to(self.G.device))
 
-        d_pred_real = self.D(real_data.to(self.D.device))
+        d_pred_real, d_pred_fake = self.discriminate(real_data, fake_data)
 
         if self.label_smoothing:
             error_real = self.criterion(
-                d_pred_real, ones_target_smooth(N).to(self.D.device)
+                d_pred_real, cached_target('ones_smooth', N, self.D.device)
             )
         else:
             error_real = self.criterion(
-                d_pred_real, ones_target(N).to(self.D.device)
+                d_pred_real, cached_target('ones', N, self.D.device)
             )
 
-        d_pred_fake = self.D(fake_data.to(self.D.device))
-
         if self.label_smoothing:
             error_fake = self.criterion(
-                d_pred_fake, zeros_target_smooth(N).to(self.D.device)
+                d_pred_fake, cached_target('zeros_smooth', N, self.D.device)
             )
         else:
             error_fake = self.criterion(
-                d_pred_fake, zeros_target(N).to(self.D.device)
+                d_pred_fake, cached_target('zeros', N, self.D.device)
             )
 
         g_error = self.criterion(
-            d_pred_fake.to(self.G.device), ones_target(N).to(self.G.device)
+            d_pred_fake.to(self.G.device),
+            cached_target('ones', N, self.G.device),
         )
 
         loss = error_fake + error_real
-        grad_x = autograd.grad(
-            loss, self.G.parameters(), create_graph=True, retain_graph=True
-        )
+        grad_x, grad_y = self.joint_gradients(loss)
         grad_x_vec = torch.cat([g.contiguous().view(-1) for g in grad_x])
-        grad_y = autograd.grad(
-            loss, self.D.parameters(), create_graph=True, retain_graph=True
-        )
         grad_y_vec = torch.cat([g.contiguous().view(-1) for g in grad_y])
 
         hvp_x_vec = Hvp_vec(
-            grad_y_vec, self.G.parameters(), grad_y_vec, retain_graph=True
+            grad_y_vec,
+            self.G.parameters(),
+            grad_y_vec,
+            retain_graph=True,
+            monitor=self.monitor,
+            name='D_xy',
         )  # D_xy * grad_y
         hvp_y_vec = Hvp_vec(
-            grad_x_vec, self.D.parameters(), grad_x_vec, retain_graph=False
+            grad_x_vec,
+            self.D.parameters(),
+            grad_x_vec,
+            retain_graph=False,
+            monitor=self.monitor,
+            name='D_yx',
         )  # D_yx * grad_x
 
         p_x = torch.add(
@@ -372,6 +1273,7 @@ class Jacobi(Optimizer):
         p_x = p_x.mul_(self.lr_x.to(self.G.device))
         p_y = p_y.mul_(self.lr_y.to(self.D.device))
 
+        self.monitor.check()
         return error_real.item(), error_fake.item(), g_error.item(), p_x, p_y
 
 
@@ -382,33 +1284,33 @@ class GaussSeidel(Optimizer):
         self.lr_x = lr_x
         self.lr_y = lr_y
 
-    def step(self, real_data, labels, N):
+    def update(self, real_data, labels, N):
         # Second argument of noise is the noise_dimension parameter of build_generator
         fake_data = self.G(noise(N, 100).to(self.G.device))
-        d_pred_real = self.D(real_data.to(self.D.device))
+        d_pred_real, d_pred_fake = self.discriminate(real_data, fake_data)
         error_real = self.criterion(
-            d_pred_real, ones_target(N).to(self.D.device)
+            d_pred_real, cached_target('ones', N, self.D.device)
         )
-        d_pred_fake = self.D(fake_data.to(self.D.device))
         error_fake = self.criterion(
-            d_pred_fake, zeros_target(N).to(self.D.device)
+            d_pred_fake, cached_target('zeros', N, self.D.device)
         )
         g_error = self.criterion(
-            d_pred_fake.to(self.G.device), ones_target(N).to(self.G.device)
+            d_pred_fake.to(self.G.device),
+            cached_target('ones', N, self.G.device),
         )
         loss = error_fake + error_real
 
-        grad_x = autograd.grad(
-            loss, self.G.parameters(), create_graph=True, retain_graph=True
-        )
+        grad_x, grad_y = self.joint_gradients(loss)
         grad_x_vec = torch.cat([g.contiguous().view(-1) for g in grad_x])
-        grad_y = autograd.grad(
-            loss, self.D.parameters(), create_graph=True, retain_graph=True
-        )
         grad_y_vec = torch.cat([g.contiguous().view(-1) for g in grad_y])
 
         hvp_x_vec = Hvp_vec(
-            grad_y_vec, self.G.parameters(), grad_y_vec, retain_graph=True
+            grad_y_vec,
+            self.G.parameters(),
+            grad_y_vec,
+            retain_graph=True,
+            monitor=self.monitor,
+            name='D_xy',
         )  # D_xy * grad_y
         p_x = torch.add(
             grad_x_vec, 2 * hvp_x_vec
@@ -425,16 +1327,16 @@ class GaussSeidel(Optimizer):
 
         # Second argument of noise is the noise_dimension parameter of build_generator
         fake_data = self.G(noise(N, 100).to(self.G.device))
-        d_pred_real = self.D(real_data.to(self.D.device))
+        d_pred_real, d_pred_fake = self.discriminate(real_data, fake_data)
         error_real = self.criterion(
-            d_pred_real, ones_target(N).to(self.D.device)
+            d_pred_real, cached_target('ones', N, self.D.device)
         )
-        d_pred_fake = self.D(fake_data.to(self.D.device))
         error_fake = self.criterion(
-            d_pred_fake, zeros_target(N).to(self.D.device)
+            d_pred_fake, cached_target('zeros', N, self.D.device)
         )
         g_error = self.criterion(
-            d_pred_fake.to(self.G.device), ones_target(N).to(self.G.device)
+            d_pred_fake.to(self.G.device),
+            cached_target('ones', N, self.G.device),
         )
         loss = error_fake + error_real
 
@@ -444,7 +1346,12 @@ class GaussSeidel(Optimizer):
         grad_x_vec = torch.cat([g.contiguous().view(-1) for g in grad_x])
 
         hvp_y_vec = Hvp_vec(
-            grad_x_vec, self.D.parameters(), grad_x_vec, retain_graph=True
+            grad_x_vec,
+            self.D.parameters(),
+            grad_x_vec,
+            retain_graph=True,
+            monitor=self.monitor,
+            name='D_yx',
         )  # D_yx * grad_x
         p_y = torch.add(
             -grad_y_vec, -2 * hvp_y_vec
@@ -458,6 +1365,7 @@ class GaussSeidel(Optimizer):
             index += p.numel()
         if index != p_y.numel():
             raise RuntimeError('CG size mismatch')
+        self.monitor.check()
         return error_real.item(), error_fake.item(), g_error.item()
 
 
@@ -469,29 +1377,25 @@ class SGD(Optimizer):
         super(SGD, self).__init__(G, D, criterion, model_name)
         self.lr = lr
 
-    def step(self, real_data, N):
+    def update(self, real_data, N):
         # Second argument of noise is the noise_dimension parameter of build_generator
         fake_data = self.G(noise(N, 100).to(self.G.device))
-        d_pred_real = self.D(real_data.to(self.D.device))
+        d_pred_real, d_pred_fake = self.discriminate(real_data, fake_data)
         error_real = self.criterion(
-            d_pred_real, ones_target(N).to(self.D.device)
+            d_pred_real, cached_target('ones', N, self.D.device)
         )
-        d_pred_fake = self.D(fake_data.to(self.D.device))
         error_fake = self.criterion(
-            d_pred_fake, zeros_target(N).to(self.D.device)
+            d_pred_fake, cached_target('zeros', N, self.D.device)
         )
         g_error = self.criterion(
-            d_pred_fake.to(self.G.device), ones_target(N).to(self.G.device)
+            d_pred_fake.to(self.G.device),
+            cached_target('ones', N, self.G.device),
         )
         loss = error_fake + error_real
         # loss = d_pred_real.mean() - d_pred_fake.mean()
-        grad_x = autograd.grad(
-            loss, self.G.parameters(), create_graph=True, retain_graph=True
-        )
+        # first-order step: no graph of the gradients is needed
+        grad_x, grad_y = self.joint_gradients(loss, create_graph=False)
         grad_x_vec = torch.cat([g.contiguous().view(-1) for g in grad_x])
-        grad_y = autograd.grad(
-            loss, self.D.parameters(), create_graph=True, retain_graph=True
-        )
         grad_y_vec = torch.cat([g.contiguous().view(-1) for g in grad_y])
         scaled_grad_x = torch.mul(self.lr.to(self.G.device), grad_x_vec)
         scaled_grad_y = torch.mul(self.lr.to(self.D.device), grad_y_vec)
@@ -504,74 +1408,153 @@ class SGD(Optimizer):
 
 ##############################################################################
 class Newton(Optimizer):
-    def __init__(self, G, D, criterion, model_name, lr_x=1e-3, lr_y=1e-3):
+    state_names = ('count', 'warm_start_x', 'warm_start_y')
+
+    def __init__(
+        self,
+        G,
+        D,
+        criterion,
+        model_name,
+        lr_x=1e-3,
+        lr_y=1e-3,
+        warm_start=True,
+        extrapolate=False,
+        forward_mode=False,
+        solver='cg',
+        restart=20,
+        time_budget=None,
+    ):
         super(Newton, self).__init__(G, D, criterion, model_name)
         self.lr_x = lr_x
         self.lr_y = lr_y
-
-    def step(self, real_data, N):
+        self.forward_mode = forward_mode
+        self.solver = solver
+        self.restart = restart
+        self.time_budget = time_budget
+        self.solve_residual = None
+        self.warm_start_x = WarmStart(warm_start, extrapolate)
+        self.warm_start_y = WarmStart(warm_start, extrapolate)
+
+    def update(self, real_data, N):
         # Second argument of noise is the noise_dimension parameter of build_generator
-        fake_data = self.G(noise(N, 100).to(self.G.device))
-        d_pred_real = self.D(real_data.to(self.D.device))
+        generator_noise = noise(N, 100).to(self.G.device)
+        fake_data = self.G(generator_noise)
+        d_pred_real, d_pred_fake = self.discriminate(real_data, fake_data)
         error_real = self.criterion(
-            d_pred_real, ones_target(N).to(self.D.device)
+            d_pred_real, cached_target('ones', N, self.D.device)
         )
-        d_pred_fake = self.D(fake_data.to(self.D.device))
         error_fake = self.criterion(
-            d_pred_fake, zeros_target(N).to(self.D.device)
+            d_pred_fake, cached_target('zeros', N, self.D.device)
         )
         g_error = self.criterion(
-            d_pred_fake.to(self.G.device), ones_target(N).to(self.G.device)
+            d_pred_fake.to(self.G.device),
+            cached_target('ones', N, self.G.device),
         )
         loss = error_fake + error_real
+        costs = self.forward_costs(generator_noise, real_data, N)
 
-        grad_x = autograd.grad(
-            loss, self.G.parameters(), create_graph=True, retain_graph=True
-        )
+        grad_x, grad_y = self.joint_gradients(loss, create_graph=costs is None)
         grad_x_vec = torch.cat([g.contiguous().view(-1) for g in grad_x])
-        grad_y = autograd.grad(
-            loss, self.D.parameters(), create_graph=True, retain_graph=True
-        )
         grad_y_vec = torch.cat([g.contiguous().view(-1) for g in grad_y])
 
-        hvp_x_vec = Hvp_vec(
-            grad_y_vec, self.G.parameters(), grad_y_vec, retain_graph=True
-        )  # D_xy * grad_y
-        hvp_y_vec = Hvp_vec(
-            grad_x_vec, self.D.parameters(), grad_x_vec, retain_graph=True
-        )  # D_yx * grad_x
+        operator = self.mixed_hessian_operator(
+            grad_x_vec,
+            grad_y_vec,
+            self.lr_x,
+            self.lr_y,
+            None if costs is None else (costs[0], costs[0]),
+        )
+        if self.spectrum is not None:
+            self.spectrum.update(operator)
 
+        hvp_x_vec = operator.D_xy(grad_y_vec)  # D_xy * grad_y
         right_side_x = torch.add(
             grad_x_vec, 2 * hvp_x_vec
         ).detach_()  # grad_x + 2 * D_xy * grad_y
+        hvp_y_vec = operator.D_yx(grad_x_vec)  # D_yx * grad_x
         right_side_y = torch.add(
             -grad_y_vec, -2 * hvp_y_vec
         ).detach_()  # grad_y + 2 * D_yx * grad_x
 
-        p_x = general_conjugate_gradient_jacobi(
-            grad_x_vec,
-            self.G.parameters(),
-            right_side_x,
-            x=None,
-            nsteps=1000,
-            residual_tol=1e-16,
-            device=self.G.device,
+        guess_x = self.warm_start_x.guess(
+            self.lr_x, right_side_x.shape[0], self.G.device
         )
-        p_y = general_conjugate_gradient_jacobi(
-            grad_y_vec,
-            self.D.parameters(),
-            right_side_y,
-            x=None,
-            nsteps=1000,
-            residual_tol=1e-16,
-            device=self.D.device,
+        guess_y = self.warm_start_y.guess(
+            self.lr_y, right_side_y.shape[0], self.D.device
         )
-        p_x = p_x[0]
-        p_y = p_y[0]
+        if self.solver == 'cg':
+            # general_conjugate_gradient_jacobi takes right_side as its
+            # initial residual, so it always starts from zero
+            p_x, iter_x = general_conjugate_gradient_jacobi(
+                grad_x_vec,
+                self.G.parameters(),
+                right_side_x,
+                x=None,
+                nsteps=1000,
+                residual_tol=1e-16,
+                device=self.G.device,
+                hvp=operator.D_xx,
+                telemetry=self.telemetry,
+            )
+            p_y, iter_y = general_conjugate_gradient_jacobi(
+                grad_y_vec,
+                self.D.parameters(),
+                right_side_y,
+                x=None,
+                nsteps=1000,
+                residual_tol=1e-16,
+                device=self.D.device,
+                hvp=operator.D_yy,
+                telemetry=self.telemetry,
+            )
+            self.solve_residual = None
+        elif self.solver == 'minres' or self.solver == 'gmres':
+            # I - 2 * D_xx is symmetric but indefinite: MINRES is the
+            # solver for it, restarted GMRES discards its Krylov subspace
+            # at every restart and needs several times more products; it
+            # is only meant for a nonsymmetric (e.g. forward-mode) system
+            system_x = ShiftedHessianOperator(
+                operator.D_xx, operator.n_x, self.G.device
+            )
+            system_y = ShiftedHessianOperator(
+                operator.D_yy, operator.n_y, self.D.device
+            )
+            if self.solver == 'minres':
+                solve = minres
+                options = {}
+            else:
+                solve = gmres
+                options = {'restart': self.restart}
+            p_x, iter_x, residual_x = solve(
+                system_x,
+                right_side_x,
+                x=guess_x,
+                nsteps=1000,
+                residual_tol=1e-16,
+                time_budget=self.time_budget,
+                **options
+            )
+            p_y, iter_y, residual_y = solve(
+                system_y,
+                right_side_y,
+                x=guess_y,
+                nsteps=1000,
+                residual_tol=1e-16,
+                time_budget=self.time_budget,
+                **options
+            )
+            self.solve_residual = (residual_x, residual_y)
+        else:
+            raise RuntimeError('Solver type is not valid')
+        self.iter_num = (iter_x, iter_y)
+        self.warm_start_x.update(p_x)
+        self.warm_start_y.update(p_y)
 
         p_x = p_x.mul_(self.lr_x.sqrt().to(self.G.device))
         p_y = p_y.mul_(self.lr_y.sqrt().to(self.D.device))
 
+        self.monitor.check()
         return error_real.item(), error_fake.item(), g_error.item(), p_x, p_y
 
 
@@ -584,18 +1567,18 @@ class JacobiMultiCost(Optimizer):
         self.lr_x = lr_x
         self.lr_y = lr_y
 
-    def step(self, real_data, N):
+    def update(self, real_data, N):
         fake_data = self.G(noise(N, 100).to(self.G.device))
-        d_pred_real = self.D(real_data.to(self.D.device))
+        d_pred_real, d_pred_fake = self.discriminate(real_data, fake_data)
         error_real = self.criterion(
-            d_pred_real, ones_target(N).to(self.D.device)
+            d_pred_real, cached_target('ones', N, self.D.device)
         )
-        d_pred_fake = self.D(fake_data.to(self.D.device))
         error_fake = self.criterion(
-            d_pred_fake, zeros_target(N).to(self.D.device)
+            d_pred_fake, cached_target('zeros', N, self.D.device)
         )
         g_error = self.criterion(
-            d_pred_fake.to(self.G.device), ones_target(N).to(self.G.device)
+            d_pred_fake.to(self.G.device),
+            cached_target('ones', N, self.G.device),
         )
 
         g = error_fake + error_real  # f cost relative to discriminator
@@ -620,10 +1603,20 @@ class JacobiMultiCost(Optimizer):
         grad_g_y_vec = torch.cat([g.contiguous().view(-1) for g in grad_g_y])
 
         D_f_xy = Hvp_vec(
-            grad_f_y_vec, self.G.parameters(), grad_g_y_vec, retain_graph=True
+            grad_f_y_vec,
+            self.G.parameters(),
+            grad_g_y_vec,
+            retain_graph=True,
+            monitor=self.monitor,
+            name='D_f_xy',
         )
         D_g_yx = Hvp_vec(
-            grad_g_x_vec, self.D.parameters(), grad_f_x_vec, retain_graph=True
+            grad_g_x_vec,
+            self.D.parameters(),
+            grad_f_x_vec,
+            retain_graph=True,
+            monitor=self.monitor,
+            name='D_g_yx',
         )
 
         p_x = torch.add(
@@ -635,11 +1628,14 @@ class JacobiMultiCost(Optimizer):
         p_x = p_x.mul_(-self.lr_x.to(self.G.device))
         p_y = p_y.mul_(-self.lr_y.to(self.D.device))
 
+        self.monitor.check()
         return error_real.item(), error_fake.item(), g_error.item(), p_x, p_y
 
 
 #################################################################################
 class Adam(Optimizer):
+    state_names = ('count', 'optimizer_G', 'optimizer_D')
+
     def __init__(
         self,
         G,
@@ -668,8 +1664,12 @@ class Adam(Optimizer):
         self.optimizer_D = torch.optim.Adam(
             self.D.parameters(), lr=self.lr_y, betas=(self.b1, self.b2)
         )
+        # the param groups of the two torch optimizers are the ones in use
+        self.param_groups = (
+            self.optimizer_G.param_groups + self.optimizer_D.param_groups
+        )
 
-    def step(self, real_data, labels, N):
+    def update(self, real_data, labels, N):
         if self.conditional == True:
             # Generator step
             self.optimizer_G.zero_grad()
@@ -686,7 +1686,8 @@ class Adam(Optimizer):
                 fake_data.to(self.D.device), fake_labels.to(self.D.device)
             )
             g_error = self.criterion(
-                d_pred_fake.to(self.G.device), ones_target(N).to(self.G.device)
+                d_pred_fake.to(self.G.device),
+                cached_target('ones', N, self.G.device),
             )
 
             g_error.backward()
@@ -698,14 +1699,14 @@ class Adam(Optimizer):
                 real_data.to(self.D.device), labels.to(self.D.device)
             )
             error_real = self.criterion(
-                d_pred_real, ones_target(N).to(self.D.device)
+                d_pred_real, cached_target('ones', N, self.D.device)
             )
             d_pred_fake = self.D(
                 fake_data.to(self.D.device).detach(),
                 fake_labels.to(self.D.device),
             )
             error_fake = self.criterion(
-                d_pred_fake, zeros_target(N).to(self.D.device)
+                d_pred_fake, cached_target('zeros', N, self.D.device)
             )
 
             d_loss = (error_real + error_fake) / 2
@@ -721,7 +1722,7 @@ class Adam(Optimizer):
             d_pred_fake = self.D(fake_data.to(self.D.device))
             g_error = self.criterion(
                 d_pred_fake.to(self.G.device),
-                self.target_1(N).to(self.G.device),
+                cached_target(self.target_1, N, self.G.device),
             )
 
             g_error.backward()
@@ -731,11 +1732,11 @@ class Adam(Optimizer):
             # Measure discriminator's ability to classify real from generated samples
             d_pred_real = self.D(real_data.to(self.D.device))
             error_real = self.criterion(
-                d_pred_real, self.target_1(N).to(self.D.device)
+                d_pred_real, cached_target(self.target_1, N, self.D.device)
             )
             d_pred_fake = self.D(fake_data.to(self.D.device).detach())
             error_fake = self.criterion(
-                d_pred_fake, self.target_0(N).to(self.D.device)
+                d_pred_fake, cached_target(self.target_0, N, self.D.device)
             )
 
             d_loss = (error_real + error_fake) / 2
@@ -747,103 +1748,169 @@ class Adam(Optimizer):
 
 ####################################################################
 class CGDMultiCost(Optimizer):
-    def __init__(self, G, D, criterion, model_name, lr_x=1e-3, lr_y=1e-3):
+    state_names = ('count', 'warm_start_x', 'warm_start_y')
+
+    def __init__(
+        self,
+        G,
+        D,
+        criterion,
+        model_name,
+        lr_x=1e-3,
+        lr_y=1e-3,
+        warm_start=True,
+        extrapolate=False,
+        forward_mode=False,
+        joint_solve=False,
+        solver='cg',
+        solver_steps=20,
+        check_every=5,
+        richardson_tol=None,
+        curvature_fraction=None,
+    ):
         super(CGDMultiCost, self).__init__(G, D, criterion, model_name)
         self.lr_x = lr_x
         self.lr_y = lr_y
-
-    def step(self, real_data, N):
-        fake_data = self.G(noise(N, 100).to(self.G.device))
-        d_pred_real = self.D(real_data.to(self.D.device))
+        self.forward_mode = forward_mode
+        self.solver = solver
+        self.solver_steps = solver_steps
+        self.check_every = check_every
+        self.richardson_tol = richardson_tol
+        self.curvature_fraction = curvature_fraction
+        self.joint_solve = joint_solve
+        self.warm_start_x = WarmStart(warm_start, extrapolate)
+        self.warm_start_y = WarmStart(warm_start, extrapolate)
+
+    def update(self, real_data, N):
+        generator_noise = noise(N, 100).to(self.G.device)
+        fake_data = self.G(generator_noise)
+        d_pred_real, d_pred_fake = self.discriminate(real_data, fake_data)
         error_real = self.criterion(
-            d_pred_real, ones_target(N).to(self.D.device)
+            d_pred_real, cached_target('ones', N, self.D.device)
         )
-        d_pred_fake = self.D(fake_data.to(self.D.device))
         error_fake = self.criterion(
-            d_pred_fake, zeros_target(N).to(self.D.device)
+            d_pred_fake, cached_target('zeros', N, self.D.device)
         )
         g_error = self.criterion(
-            d_pred_fake.to(self.G.device), ones_target(N).to(self.G.device)
+            d_pred_fake.to(self.G.device),
+            cached_target('ones', N, self.G.device),
         )
 
         g = error_fake + error_real  # g cost relative to discriminator
         f = g_error  # f cost relative to generator
+        costs = self.forward_costs(generator_noise, real_data, N)
+        curvature = self.curvature_gradients(
+            generator_noise, real_data, N, costs, multi_cost=True
+        )
+        create_graph = costs is None and curvature is None
         grad_f_x = autograd.grad(
-            f, self.G.parameters(), create_graph=True, retain_graph=True
+            f,
+            self.G.parameters(),
+            create_graph=create_graph,
+            retain_graph=True,
         )
         grad_g_x = autograd.grad(
-            g, self.G.parameters(), create_graph=True, retain_graph=True
+            g,
+            self.G.parameters(),
+            create_graph=create_graph,
+            retain_graph=True,
         )
         grad_f_x_vec = torch.cat([g.contiguous().view(-1) for g in grad_f_x])
         grad_g_x_vec = torch.cat([g.contiguous().view(-1) for g in grad_g_x])
 
         grad_f_y = autograd.grad(
-            f, self.D.parameters(), create_graph=True, retain_graph=True
+            f,
+            self.D.parameters(),
+            create_graph=create_graph,
+            retain_graph=True,
         )
         grad_g_y = autograd.grad(
-            g, self.D.parameters(), create_graph=True, retain_graph=True
+            g,
+            self.D.parameters(),
+            create_graph=create_graph,
+            retain_graph=True,
         )
         grad_f_y_vec = torch.cat([g.contiguous().view(-1) for g in grad_f_y])
         grad_g_y_vec = torch.cat([g.contiguous().view(-1) for g in grad_g_y])
 
         scaled_grad_f_x = torch.mul(self.lr_x, grad_f_x_vec)
         scaled_grad_g_y = torch.mul(self.lr_y, grad_g_y_vec)
-
-        D_f_xy = Hvp_vec(
+        # costs are (g, f): grad_g_x and grad_f_y build the operators
+        operator_x = self.mixed_hessian_operator(
+            grad_g_x_vec,
             grad_f_y_vec,
-            self.G.parameters(),
-            scaled_grad_g_y,
-            retain_graph=True,
-        )  # Dxy_f * lr * grad_g_y
-        D_g_yx = Hvp_vec(
+            self.lr_x,
+            self.lr_y,
+            costs,
+            curvature,
+        )
+        if self.spectrum is not None:
+            self.spectrum.update(operator_x)
+        # as in the original y solve, D plays x with lr_x, G y with lr_y
+        operator_y = self.mixed_hessian_operator(
             grad_g_x_vec,
-            self.D.parameters(),
-            scaled_grad_f_x,
-            retain_graph=True,
-        )  # Dyx_g* lr * grad_f_x
+            grad_f_y_vec,
+            self.lr_x,
+            self.lr_y,
+            costs,
+            curvature,
+            transpose=True,
+        )
 
+        D_f_xy = operator_x.D_xy(scaled_grad_g_y)  # Dxy_f * lr * grad_g_y
         p_x = torch.add(
             grad_f_x_vec, -D_f_xy
         ).detach_()  # grad_f_x - Df_xy * lr * grad_g_y
+        D_g_yx = operator_x.D_yx(scaled_grad_f_x)  # Dyx_g* lr * grad_f_x
         p_y = torch.add(
             grad_g_y_vec, -D_g_yx  # Segno di questa
         ).detach_()  # grad_g_y - Dg_yx * lr * grad_f_x
 
         p_x.mul_(self.lr_x.sqrt())
+        p_y.mul_(self.lr_y.sqrt())
 
-        cg_x, iter_num = general_conjugate_gradient(
-            grad_x=grad_g_x_vec,
-            grad_y=grad_f_y_vec,
-            x_params=self.G.parameters(),
-            y_params=self.D.parameters(),
-            kk=p_x,
-            x=None,
-            nsteps=p_x.shape[0],
-            lr_x=self.lr_x,
-            lr_y=self.lr_y,
-        )
+        if self.joint_solve:
+            cg_x, cg_y, iter_x, iter_y = joint_conjugate_gradient(
+                operator_x,
+                operator_y,
+                p_x,
+                p_y,
+                x=self.warm_start_x.guess(self.lr_x, p_x.shape[0]),
+                y=self.warm_start_y.guess(self.lr_y, p_y.shape[0]),
+                nsteps=max(p_x.shape[0], p_y.shape[0]),
+            )
+            self.iter_num = (iter_x, iter_y)
+            self.warm_start_x.update(cg_x)
+            self.warm_start_y.update(cg_y)
+            cg_x.detach_().mul_(-self.lr_y.sqrt())  # Necessario ?
+        else:
+            cg_x, iter_num = self.competitive_solve(
+                operator_x,
+                p_x,
+                self.warm_start_x.guess(self.lr_x, p_x.shape[0]),
+                nsteps=p_x.shape[0],
+            )
+            self.warm_start_x.update(cg_x)
 
-        cg_x.detach_().mul_(-self.lr_y.sqrt())  # Necessario ?
+            cg_x.detach_().mul_(-self.lr_y.sqrt())  # Necessario ?
 
-        p_y.mul_(self.lr_y.sqrt())
-        cg_y, iter_num = general_conjugate_gradient(
-            grad_x=grad_f_y_vec,
-            grad_y=grad_g_x_vec,
-            x_params=self.D.parameters(),
-            y_params=self.G.parameters(),
-            kk=p_y,
-            x=None,
-            nsteps=p_y.shape[0],
-            lr_x=self.lr_x,
-            lr_y=self.lr_y,
-        )
+            cg_y, iter_num = self.competitive_solve(
+                operator_y,
+                p_y,
+                self.warm_start_y.guess(self.lr_y, p_y.shape[0]),
+                nsteps=p_y.shape[0],
+            )
+            self.warm_start_y.update(cg_y)
 
         cg_y.detach_().mul_(-self.lr_y.sqrt())  # moltiplicare per -lr o +lr
 
-        return error_real.item(), error_fake.item(), errorG.item(), cg_x, cg_y
+        self.monitor.check()
+        return error_real.item(), error_fake.item(), g_error.item(), cg_x, cg_y
 
 
 class Adam_torch(Optimizer):
+    state_names = ('count', 'optimizer_G', 'optimizer_D')
+
     def __init__(
         self,
         G,
@@ -872,8 +1939,12 @@ class Adam_torch(Optimizer):
         self.optimizer_D = torch.optim.Adam(
             self.D.parameters(), lr=self.lr_y, betas=(self.b1, self.b2)
         )
+        # the param groups of the two torch optimizers are the ones in use
+        self.param_groups = (
+            self.optimizer_G.param_groups + self.optimizer_D.param_groups
+        )
 
-    def step(self, real_data, labels, N):
+    def update(self, real_data, labels, N):
         if self.conditional == True:
             # Generator step
             self.optimizer_G.zero_grad()
@@ -891,12 +1962,10 @@ class Adam_torch(Optimizer):
             d_pred_fake = self.D(
                 fake_data.to(self.D.device), fake_labels.to(self.D.device)
             )
-            label_1 = torch.full((N,), 1.0, dtype=torch.float).to(
-                self.G.device
-            )
-            g_error = self.criterion(
-                d_pred_fake.to(self.G.device), label_1.to(self.G.device)
+            label_1 = cached_target(
+                'ones_resnet', N, self.G.device, dtype=torch.float
             )
+            g_error = self.criterion(d_pred_fake.to(self.G.device), label_1)
 
             g_error.backward()
             self.optimizer_G.step()
@@ -906,15 +1975,18 @@ class Adam_torch(Optimizer):
             d_pred_real = self.D(
                 real_data.to(self.D.device), labels.to(self.D.device)
             )
-            error_real = self.criterion(d_pred_real, label_1.to(self.D.device))
+            label_1 = cached_target(
+                'ones_resnet', N, self.D.device, dtype=torch.float
+            )
+            error_real = self.criterion(d_pred_real, label_1)
             d_pred_fake = self.D(
                 fake_data.to(self.D.device).detach(),
                 fake_labels.to(self.D.device),
             )
-            label_0 = torch.full((N,), 0.0, dtype=torch.float).to(
-                self.D.device
+            label_0 = cached_target(
+                'zeros_resnet', N, self.D.device, dtype=torch.float
             )
-            error_fake = self.criterion(d_pred_fake, label_0.to(self.D.device))
+            error_fake = self.criterion(d_pred_fake, label_0)
 
             d_loss = (error_real + error_fake) / 2
             d_loss.backward()
@@ -928,8 +2000,8 @@ class Adam_torch(Optimizer):
             # Second argument of noise is the noise_dimension parameter of build_generator
             fake_data = self.G(noise)
             d_pred_fake = self.D(fake_data.to(self.D.device)).view(-1)
-            label_1 = torch.full((N,), 1.0, dtype=torch.float).to(
-                self.G.device
+            label_1 = cached_target(
+                'ones_resnet', N, self.G.device, dtype=torch.float
             )
             g_error = self.criterion(d_pred_fake.to(self.G.device), label_1)
 
@@ -939,13 +2011,13 @@ class Adam_torch(Optimizer):
             self.optimizer_D.zero_grad()
             # Measure discriminator's ability to classify real from generated samples
             d_pred_real = self.D(real_data.to(self.D.device)).view(-1)
-            label_1 = torch.full((N,), 1.0, dtype=torch.float).to(
-                self.D.device
+            label_1 = cached_target(
+                'ones_resnet', N, self.D.device, dtype=torch.float
             )
             error_real = self.criterion(d_pred_real, label_1)
             d_pred_fake = self.D(fake_data.to(self.D.device).detach()).view(-1)
-            label_0 = torch.full((N,), 0.0, dtype=torch.float).to(
-                self.D.device
+            label_0 = cached_target(
+                'zeros_resnet', N, self.D.device, dtype=torch.float
             )
             error_fake = self.criterion(d_pred_fake, label_0)
 
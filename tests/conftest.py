@@ -0,0 +1,100 @@
+import os
+import sys
+
+import pytest
+import torch
+from torch import nn
+
+# the modules of the repository are imported as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class DenseOperator(object):
+    '''
+    Operator interface of MixedHessianOperator on an explicit matrix
+    '''
+
+    def __init__(self, A):
+        self.A = A
+        self.n_x = A.shape[0]
+        self.n_y = A.shape[0]
+        self.device_x = A.device
+        self.dtype = A.dtype
+
+    def matvec(self, vec):
+        return self.A @ vec
+
+
+@pytest.fixture
+def dense_system():
+    '''
+    Dense SPD system I + B B^T with a random right-hand side
+    '''
+    torch.manual_seed(0)
+    B = torch.randn(60, 10, dtype=torch.float64)
+    A = torch.eye(60, dtype=torch.float64) + B @ B.t() / 10
+    b = torch.randn(60, dtype=torch.float64)
+    return A, b
+
+
+class Generator(nn.Module):
+    '''
+    Small generator with a BatchNorm layer, noise dimension 100
+    '''
+
+    def __init__(self, width=16):
+        super(Generator, self).__init__()
+        self.net = nn.Sequential(
+            nn.Linear(100, width),
+            nn.BatchNorm1d(width),
+            nn.Tanh(),
+            nn.Linear(width, 8),
+        )
+
+    def forward(self, z):
+        return self.net(z)
+
+    def to(self, device):
+        super(Generator, self).to(device)
+        self.device = device
+        return self
+
+
+class Discriminator(nn.Module):
+    '''
+    Small discriminator with a BatchNorm layer on 8 features
+    '''
+
+    def __init__(self, width=16):
+        super(Discriminator, self).__init__()
+        self.net = nn.Sequential(
+            nn.Linear(8, width),
+            nn.BatchNorm1d(width),
+            nn.LeakyReLU(0.2),
+            nn.Linear(width, 1),
+        )
+
+    def forward(self, x):
+        return self.net(x)
+
+    def to(self, device):
+        super(Discriminator, self).to(device)
+        self.device = device
+        return self
+
+
+class FlatNoiseGenerator(Generator):
+    '''
+    Generator of the players taking the (N, 100, 1, 1) noise of Adam_torch
+    '''
+
+    def forward(self, z):
+        return super(FlatNoiseGenerator, self).forward(z.flatten(1))
+
+
+@pytest.fixture
+def players():
+    torch.manual_seed(0)
+    G = Generator().to(torch.device('cpu'))
+    D = Discriminator().to(torch.device('cpu'))
+    return G, D, nn.BCEWithLogitsLoss()
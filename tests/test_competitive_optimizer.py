@@ -0,0 +1,104 @@
+import copy
+
+import pytest
+import torch
+
+import optimizers
+from conftest import Discriminator, FlatNoiseGenerator
+
+
+def lr():
+    return torch.tensor([0.01])
+
+
+# every algorithm behind the step(closure) interface
+PATHS = {
+    'CGD': lambda G, D, c: optimizers.CGD(G, D, c, 'MLP', lr()),
+    'CGD_shafer': lambda G, D, c: optimizers.CGD_shafer(
+        G, D, c, 'MLP', lr=0.01
+    ),
+    'CGD_shafer solve_x': lambda G, D, c: optimizers.CGD_shafer(
+        G, D, c, 'MLP', lr=0.01, solve_x=True
+    ),
+    'Jacobi': lambda G, D, c: optimizers.Jacobi(G, D, c, 'MLP', lr(), lr()),
+    'SGD': lambda G, D, c: optimizers.SGD(G, D, c, 'MLP', lr()),
+    'Newton': lambda G, D, c: optimizers.Newton(G, D, c, 'MLP', lr(), lr()),
+    'JacobiMultiCost': lambda G, D, c: optimizers.JacobiMultiCost(
+        G, D, c, 'MLP', lr(), lr()
+    ),
+    'CGDMultiCost': lambda G, D, c: optimizers.CGDMultiCost(
+        G, D, c, 'MLP', lr(), lr()
+    ),
+}
+
+
+@pytest.mark.parametrize('path', sorted(PATHS))
+def test_one_step(players, path):
+    G, D, criterion = players
+    optimizer = PATHS[path](G, D, criterion)
+    params = list(G.parameters()) + list(D.parameters())
+    before = [p.detach().clone() for p in params]
+    errors = optimizer.step(lambda: (torch.randn(10, 8), 10))
+    assert all(torch.isfinite(torch.tensor(errors)))
+    after = list(G.parameters()) + list(D.parameters())
+    assert all(torch.isfinite(p).all() for p in after)
+    assert any(not torch.equal(p, q) for p, q in zip(before, after))
+
+
+def test_one_step_with_labels(players):
+    G, D, criterion = players
+    optimizer = optimizers.GaussSeidel(G, D, criterion, 'MLP', lr(), lr())
+    errors = optimizer.step(lambda: (torch.randn(10, 8), None, 10))
+    assert all(torch.isfinite(torch.tensor(errors)))
+
+
+def adam(G, D, criterion):
+    return optimizers.Adam_torch(G, D, criterion, 'MLP', lr(), lr(), 10)
+
+
+@pytest.mark.parametrize(
+    'build, batch',
+    [
+        (PATHS['CGD'], lambda real: (real, 10)),
+        (PATHS['CGD_shafer'], lambda real: (real, 10)),
+        (PATHS['CGDMultiCost'], lambda real: (real, 10)),
+        (adam, lambda real: (real, None, 10)),
+    ],
+    ids=['CGD', 'CGD_shafer', 'CGDMultiCost', 'Adam_torch'],
+)
+def test_checkpoint_round_trip(tmp_path, build, batch):
+    torch.manual_seed(0)
+    G = FlatNoiseGenerator().to(torch.device('cpu'))
+    D = Discriminator().to(torch.device('cpu'))
+    criterion = torch.nn.BCEWithLogitsLoss()
+    optimizer = build(G, D, criterion)
+    optimizer.step(lambda: batch(torch.randn(10, 8)))
+    torch.save(
+        {
+            'G': G.state_dict(),
+            'D': D.state_dict(),
+            'optimizer': optimizer.state_dict(),
+        },
+        tmp_path / 'checkpoint.pt',
+    )
+    resumed_G, resumed_D = copy.deepcopy(G), copy.deepcopy(D)
+    real_data = torch.randn(10, 8)
+    torch.manual_seed(1)
+    optimizer.step(lambda: batch(real_data))
+
+    with torch.no_grad():
+        for p in list(resumed_G.parameters()) + list(resumed_D.parameters()):
+            p.zero_()
+    checkpoint = torch.load(tmp_path / 'checkpoint.pt', weights_only=False)
+    resumed_G.load_state_dict(checkpoint['G'])
+    resumed_D.load_state_dict(checkpoint['D'])
+    resumed = build(resumed_G, resumed_D, criterion)
+    resumed.load_state_dict(checkpoint['optimizer'])
+    torch.manual_seed(1)
+    resumed.step(lambda: batch(real_data))
+
+    for p, q in zip(
+        list(G.parameters()) + list(D.parameters()),
+        list(resumed_G.parameters()) + list(resumed_D.parameters()),
+    ):
+        assert torch.equal(p, q)
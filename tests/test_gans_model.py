@@ -0,0 +1,63 @@
+import json
+
+import pytest
+import torch
+
+# the training classes import the data loaders
+pytest.importorskip('torchvision')
+import GANs_abstract_object
+from conftest import Discriminator, Generator
+
+
+class SmallGAN(GANs_abstract_object.GANs_model):
+    model_name = 'MLP'
+
+    def build_discriminator(self):
+        return Discriminator()
+
+    def build_generator(self):
+        return Generator()
+
+    def train(self):
+        pass
+
+
+def small_gan():
+    torch.manual_seed(0)
+    return SmallGAN([(torch.randn(8), 0)], 10, 'MLP')
+
+
+def test_telemetry_from_the_configuration(tmp_path):
+    model = small_gan()
+    model.optimizer_initialize(
+        torch.nn.BCEWithLogitsLoss(),
+        torch.tensor([0.01]),
+        torch.tensor([0.01]),
+        'CGD',
+        10,
+        'MLP',
+        telemetry_path=str(tmp_path),
+    )
+    model.optimizer.step(lambda: (torch.randn(10, 8), 10))
+    model.flush_telemetry()
+    with open(tmp_path / 'solver_telemetry_MPI_rank_0.jsonl') as f:
+        records = [json.loads(line) for line in f]
+    assert records and records[0]['solver'] == 'cg'
+
+
+def test_parameter_arena_from_the_configuration():
+    model = small_gan()
+    model.optimizer_initialize(
+        torch.nn.BCEWithLogitsLoss(),
+        torch.tensor([0.01]),
+        torch.tensor([0.01]),
+        'CGD',
+        10,
+        'MLP',
+        parameter_arena=True,
+    )
+    assert model.optimizer.arena_G is model.arena_G
+    assert model.optimizer.arena_D is model.arena_D
+    before = model.arena_G.data.clone()
+    model.optimizer.step(lambda: (torch.randn(10, 8), 10))
+    assert not torch.equal(model.arena_G.data, before)
@@ -0,0 +1,527 @@
+import copy
+
+import pytest
+import torch
+from torch import autograd
+
+import models
+import optimizers
+import utils
+from conftest import (
+    DenseOperator,
+    Discriminator,
+    FlatNoiseGenerator,
+    Generator,
+)
+
+
+def reverse_operator(G, D, criterion, generator_noise, real_data, lr):
+    N = real_data.shape[0]
+    prediction_real = D(real_data)
+    prediction_fake = D(G(generator_noise))
+    loss = criterion(prediction_real, torch.ones(N, 1)) + criterion(
+        prediction_fake, torch.zeros(N, 1)
+    )
+    grad_x = autograd.grad(loss, G.parameters(), create_graph=True)
+    grad_y = autograd.grad(loss, D.parameters(), create_graph=True)
+    return utils.MixedHessianOperator(
+        torch.cat([g.reshape(-1) for g in grad_x]),
+        torch.cat([g.reshape(-1) for g in grad_y]),
+        G.parameters(),
+        D.parameters(),
+        lr,
+        lr,
+    )
+
+
+def test_forward_products_match_reverse_with_batch_norm(players):
+    G, D, criterion = players
+    lr = torch.tensor([0.01])
+    optimizer = optimizers.CGD(G, D, criterion, 'MLP', lr, forward_mode=True)
+    generator_noise = torch.randn(10, 100)
+    real_data = torch.randn(10, 8)
+    buffers = [b.clone() for b in G.buffers()] + [
+        b.clone() for b in D.buffers()
+    ]
+    costs = optimizer.forward_costs(generator_noise, real_data, 10)
+    assert costs is not None and optimizer.forward_mode_supported
+    forward = optimizer.mixed_hessian_operator(
+        None, None, lr, lr, (costs[0], costs[0])
+    )
+    vec_x = torch.randn(forward.n_x)
+    vec_y = torch.randn(forward.n_y)
+    forward_xy = forward.D_xy(vec_y).clone()
+    forward_yx = forward.D_yx(vec_x).clone()
+    # the functional passes leave the running statistics alone
+    for before, after in zip(buffers, list(G.buffers()) + list(D.buffers())):
+        assert torch.equal(before, after)
+    reverse = reverse_operator(G, D, criterion, generator_noise, real_data, lr)
+    assert torch.allclose(forward_xy, reverse.D_xy(vec_y), atol=1e-5)
+    assert torch.allclose(forward_yx, reverse.D_yx(vec_x), atol=1e-5)
+
+
+def test_forward_mode_step_on_dcgan():
+    torch.manual_seed(0)
+    G = models.GeneratorCNN(100, 1, 16)
+    D = models.DiscriminatorCNN(1, 16)
+    G.to(torch.device('cpu'))
+    D.to(torch.device('cpu'))
+    optimizer = optimizers.CGD(
+        G,
+        D,
+        torch.nn.BCEWithLogitsLoss(),
+        'CNN',
+        torch.tensor([1e-4]),
+        forward_mode=True,
+        solver='chebyshev',
+        solver_steps=5,
+    )
+    optimizer.step(lambda: (torch.randn(4, 1, 16, 16), 4))
+    assert optimizer.forward_mode_supported
+
+
+def test_chebyshev_solver_on_dense_system(players, dense_system):
+    G, D, criterion = players
+    A, b = (t.float() for t in dense_system)
+    optimizer = optimizers.CGD(
+        G,
+        D,
+        criterion,
+        'MLP',
+        torch.tensor([0.01]),
+        solver='chebyshev',
+        solver_steps=60,
+    )
+    x, sweeps = optimizer.competitive_solve(
+        DenseOperator(A), b, None, nsteps=200
+    )
+    # the power iteration bound holds: no fallback to CG
+    assert sweeps == optimizer.solver_steps
+    assert torch.allclose(A @ x, b, atol=1e-4)
+
+
+def test_chebyshev_falls_back_to_cg(players, dense_system, monkeypatch):
+    G, D, criterion = players
+    A, b = dense_system
+    optimizer = optimizers.CGD(
+        G, D, criterion, 'MLP', torch.tensor([0.01]), solver='chebyshev'
+    )
+    # an estimate far below the spectrum defeats every restart
+    monkeypatch.setattr(
+        optimizers,
+        'largest_eigenvalue',
+        lambda operator, n_iterations, vec: (1.2, None),
+    )
+    x, iterations = optimizer.competitive_solve(
+        DenseOperator(A), b, None, nsteps=200
+    )
+    assert iterations > optimizer.solver_steps
+    assert torch.allclose(A @ x, b, atol=1e-6)
+
+
+def test_batched_richardson_on_hessian_operator(players):
+    G, D, criterion = players
+    lr = torch.tensor([0.1])
+    operator = reverse_operator(
+        G, D, criterion, torch.randn(10, 100), torch.randn(10, 8), lr
+    )
+    rhs = torch.randn(operator.n_x, 3)
+    richardson = utils.Richardson(
+        operator.matvec, rhs, tol=1e-5, maxiter=50, relaxation=0.5
+    )
+    # matvec returns the same buffer for every column
+    expected = torch.stack(
+        [operator.matvec(column).clone() for column in rhs.unbind(1)], dim=1
+    )
+    assert torch.allclose(richardson.apply(rhs), expected)
+    solution = richardson.solve()
+    for i in range(3):
+        assert torch.allclose(
+            operator.matvec(solution[:, i]), rhs[:, i], atol=1e-4
+        )
+
+
+def test_richardson_stops_at_single_precision(players):
+    G, D, criterion = players
+    optimizer = optimizers.CGD(
+        G,
+        D,
+        criterion,
+        'MLP',
+        torch.tensor([0.5]),
+        solver='richardson',
+        solver_steps=50,
+    )
+    optimizer.step(lambda: (torch.randn(10, 8), 10))
+    assert optimizer.solve_stats['converged']
+    assert optimizer.iter_num < optimizer.solver_steps
+
+
+def test_curvature_pass_keeps_batch_norm_statistics(players):
+    G, D, criterion = players
+    optimizer = optimizers.CGD(
+        G, D, criterion, 'MLP', torch.tensor([0.01]), curvature_fraction=0.5
+    )
+    buffers = [b.clone() for b in G.buffers()] + [
+        b.clone() for b in D.buffers()
+    ]
+    curvature = optimizer.curvature_gradients(
+        torch.randn(10, 100), torch.randn(10, 8), 10
+    )
+    assert curvature is not None
+    for before, after in zip(buffers, list(G.buffers()) + list(D.buffers())):
+        assert torch.equal(before, after)
+
+
+def test_parallel_blocks_merge_their_health_flags(players):
+    G, D, criterion = players
+    optimizer = optimizers.CGD(
+        G,
+        D,
+        criterion,
+        'MLP',
+        torch.tensor([0.01]),
+        blocks='layers',
+        parallel_blocks=True,
+    )
+    # keep the flags of the first step
+    optimizer.monitor.every = 2
+    optimizer.step(lambda: (torch.randn(10, 8), 10))
+    assert len(optimizer.iter_num) > 1
+    assert {'D_xy', 'D_yx'} <= set(optimizer.monitor.flags)
+    assert not any(bool(flag) for flag in optimizer.monitor.flags.values())
+
+    nan = utils.HealthMonitor()
+    nan.record('D_xy', torch.tensor([float('nan')]))
+    optimizer.monitor.merge(nan)
+    with pytest.raises(ValueError):
+        optimizer.monitor.check()
+
+
+def test_parameter_arena_step_matches_per_parameter_step(players):
+    G, D, criterion = players
+    reference = copy.deepcopy((G, D))
+    real_data = torch.randn(10, 8)
+    steps = []
+    for G, D in ((G, D), reference):
+        torch.manual_seed(1)
+        optimizer = optimizers.CGD(
+            G, D, criterion, 'MLP', torch.tensor([0.01])
+        )
+        if G is players[0]:
+            optimizer.arena_G = utils.ParameterArena(G)
+            optimizer.arena_D = utils.ParameterArena(D)
+        optimizer.step(lambda: (real_data, 10))
+        steps.append(list(G.parameters()) + list(D.parameters()))
+    for p, q in zip(*steps):
+        assert torch.equal(p, q)
+
+
+def test_parameter_arena_survives_torch_adam(players):
+    _, D, criterion = players
+    G = FlatNoiseGenerator().to(torch.device('cpu'))
+    optimizer = optimizers.Adam_torch(
+        G,
+        D,
+        criterion,
+        'MLP',
+        torch.tensor([0.01]),
+        torch.tensor([0.01]),
+        10,
+    )
+    arenas = utils.ParameterArena(G), utils.ParameterArena(D)
+    before = [arena.data.clone() for arena in arenas]
+    optimizer.step(lambda: (torch.randn(10, 8), None, 10))
+    for arena, data in zip(arenas, before):
+        # the steps of torch.optim.Adam land in the arena
+        assert not torch.equal(arena.data, data)
+        assert torch.equal(
+            arena.data, torch.cat([p.reshape(-1) for p in arena.params])
+        )
+
+
+def test_newton_steps_stay_bounded_with_warm_start(players):
+    G, D, criterion = players
+    lr = torch.tensor([0.01])
+    optimizer = optimizers.Newton(G, D, criterion, 'MLP', lr, lr)
+    assert optimizer.warm_start_x.enabled
+    for _ in range(6):
+        result = optimizer.update(torch.randn(10, 8), 10)
+        optimizer.apply_update(result[3], result[4])
+        assert result[3].norm() < 0.1
+        assert max(optimizer.iter_num) <= 10
+
+
+def test_neumann_series_or_cg_by_spectral_radius(players, dense_system):
+    G, D, criterion = players
+    A, b = (t.float() for t in dense_system)
+    optimizer = optimizers.CGD(
+        G,
+        D,
+        criterion,
+        'MLP',
+        torch.tensor([0.01]),
+        solver='neumann',
+        solver_steps=60,
+    )
+    # I + A / 40 has its spectrum in [1, 1.3]: the series converges
+    contracting = torch.eye(60) + (A - torch.eye(60)) / 40
+    x, iterations = optimizer.competitive_solve(
+        DenseOperator(contracting), b, None, nsteps=200
+    )
+    assert iterations == optimizer.solver_steps
+    assert torch.allclose(contracting @ x, b, atol=1e-4)
+    # the spectrum of A reaches 12: CG instead of a diverging series
+    x, iterations = optimizer.competitive_solve(
+        DenseOperator(A), b, None, nsteps=200
+    )
+    assert iterations < optimizer.solver_steps
+    assert torch.allclose(A @ x, b, atol=1e-4)
+
+
+def test_richardson_solver_on_dense_system(players, dense_system):
+    G, D, criterion = players
+    A, b = (t.float() for t in dense_system)
+    optimizer = optimizers.CGD(
+        G,
+        D,
+        criterion,
+        'MLP',
+        torch.tensor([0.01]),
+        solver='richardson',
+        solver_steps=200,
+    )
+    x, iterations = optimizer.competitive_solve(
+        DenseOperator(A), b, None, nsteps=200
+    )
+    assert optimizer.solve_stats['converged']
+    assert iterations == optimizer.solve_stats['iterations'] < 200
+    assert torch.allclose(A @ x, b, atol=1e-4)
+
+
+def test_nystrom_solver_reuses_its_sketch(players, dense_system):
+    G, D, criterion = players
+    A, b = (t.float() for t in dense_system)
+    optimizer = optimizers.CGD(
+        G,
+        D,
+        criterion,
+        'MLP',
+        torch.tensor([0.01]),
+        solver='nystrom',
+        nystrom_rank=15,
+        nystrom_every=2,
+    )
+    applications = []
+    for _ in range(3):
+        x, iterations = optimizer.competitive_solve(
+            DenseOperator(A), b, None, nsteps=200
+        )
+        applications.append(iterations)
+        assert torch.allclose(A @ x, b, atol=1e-4)
+    # sketched on the first and third steps only
+    assert applications == [15, 0, 15]
+
+
+def test_single_reduction_cg_matches_cg(players, dense_system):
+    G, D, criterion = players
+    A, b = dense_system
+    solutions = {}
+    for solver in ('cg', 'single_reduction_cg'):
+        optimizer = optimizers.CGD(
+            G, D, criterion, 'MLP', torch.tensor([0.01]), solver=solver
+        )
+        solutions[solver] = optimizer.competitive_solve(
+            DenseOperator(A), b, None, nsteps=200
+        )
+    x, iterations = solutions['cg']
+    x_single, iterations_single = solutions['single_reduction_cg']
+    assert iterations_single == iterations
+    assert torch.allclose(x_single, x, atol=1e-10)
+    assert torch.allclose(A @ x, b, atol=1e-6)
+
+
+@pytest.mark.parametrize('solver', ['minres', 'gmres'])
+def test_newton_krylov_solvers_report_their_residual(players, solver):
+    G, D, criterion = players
+    lr = torch.tensor([0.01])
+    optimizer = optimizers.Newton(
+        G, D, criterion, 'MLP', lr, lr, solver=solver
+    )
+    errors = optimizer.step(lambda: (torch.randn(10, 8), 10))
+    assert all(torch.isfinite(torch.tensor(errors)))
+    assert len(optimizer.iter_num) == 2
+    assert all(0 <= residual < 1 for residual in optimizer.solve_residual)
+
+
+def joint_and_separate_updates(build):
+    '''
+    Updates of the first step of build(G, D, criterion, joint_solve) with
+    the block solve and with the two separate solves
+    '''
+    updates = []
+    for joint_solve in (False, True):
+        torch.manual_seed(0)
+        G = Generator().to(torch.device('cpu'))
+        D = Discriminator().to(torch.device('cpu'))
+        optimizer = build(G, D, torch.nn.BCEWithLogitsLoss(), joint_solve)
+        torch.manual_seed(1)
+        updates.append(optimizer.update(torch.randn(10, 8), 10)[3:])
+    return updates
+
+
+def test_cgd_multi_cost_joint_solve_matches_separate_solves():
+    lr = torch.tensor([0.01])
+    separate, joint = joint_and_separate_updates(
+        lambda G, D, criterion, joint_solve: optimizers.CGDMultiCost(
+            G, D, criterion, 'MLP', lr, lr, joint_solve=joint_solve
+        )
+    )
+    for p, q in zip(separate, joint):
+        assert torch.allclose(p, q, atol=1e-6)
+
+
+def test_cgd_shafer_solves_small_players():
+    # fewer than 10000 parameters still get a CG iteration
+    for update in joint_and_separate_updates(
+        lambda G, D, criterion, joint_solve: optimizers.CGD_shafer(
+            G, D, criterion, 'MLP', lr=0.01, joint_solve=joint_solve
+        )
+    ):
+        assert all(p.norm() > 0 for p in update)
+
+
+def first_cgd_updates(**options):
+    '''
+    Updates of the first CGD step on the players, with the default
+    options and with options
+    '''
+    updates = []
+    for kwargs in ({}, options):
+        torch.manual_seed(0)
+        G = Generator().to(torch.device('cpu'))
+        D = Discriminator().to(torch.device('cpu'))
+        optimizer = optimizers.CGD(
+            G,
+            D,
+            torch.nn.BCEWithLogitsLoss(),
+            'MLP',
+            torch.tensor([0.01]),
+            **kwargs
+        )
+        torch.manual_seed(1)
+        updates.append(optimizer.update(torch.randn(10, 8), 10)[3:])
+    return updates
+
+
+def test_forward_mode_step_matches_reverse_mode():
+    reverse, forward = first_cgd_updates(forward_mode=True)
+    for p, q in zip(reverse, forward):
+        assert torch.allclose(p, q, atol=1e-6)
+
+
+def test_parallel_blocks_match_serial_blocks():
+    _, serial = first_cgd_updates(blocks='layers')
+    _, parallel = first_cgd_updates(blocks='layers', parallel_blocks=True)
+    assert all(p.norm() > 0 for p in serial)
+    for p, q in zip(serial, parallel):
+        assert torch.equal(p, q)
+
+
+@pytest.mark.parametrize(
+    'solver', ['chebyshev', 'neumann', 'richardson', 'recycled_cg', 'nystrom']
+)
+def test_preconditioner_only_with_cg(players, solver):
+    G, D, criterion = players
+    for optimizer in (optimizers.CGD, optimizers.CGD_shafer):
+        with pytest.raises(RuntimeError):
+            optimizer(
+                G, D, criterion, 'MLP', solver=solver, precondition='gaussian'
+            )
+
+
+def test_fused_discriminator_matches_separate_passes():
+    results = []
+    for fuse in (False, True):
+        torch.manual_seed(0)
+        G = Generator().to(torch.device('cpu'))
+        D = Discriminator().to(torch.device('cpu'))
+        optimizer = optimizers.CGD(
+            G, D, torch.nn.BCEWithLogitsLoss(), 'MLP', torch.tensor([0.01])
+        )
+        optimizer.fuse_discriminator = fuse
+        torch.manual_seed(1)
+        update = optimizer.update(torch.randn(10, 8), 10)
+        results.append((update, [b.clone() for b in D.buffers()]))
+    (separate, separate_buffers), (fused, fused_buffers) = results
+    assert separate[:3] == pytest.approx(fused[:3], abs=1e-6)
+    for p, q in zip(separate[3:], fused[3:]):
+        assert torch.allclose(p, q, atol=1e-6)
+    # running means and variances updated once per batch, in the same order
+    for before, after in zip(separate_buffers, fused_buffers):
+        assert torch.allclose(before, after, atol=1e-6)
+
+
+def test_targets_are_shared_across_steps(players, monkeypatch):
+    G, D, criterion = players
+    cache = utils.TargetCache()
+    built = []
+    build = cache.build
+
+    def counted(kind, N, device, dtype):
+        built.append((kind, N))
+        return build(kind, N, device, dtype)
+
+    monkeypatch.setattr(cache, 'build', counted)
+    monkeypatch.setattr(utils, 'target_cache', cache)
+    ones = utils.cached_target('ones', 10, torch.device('cpu'))
+    assert utils.cached_target('ones', 10, 'cpu') is ones
+    optimizer = optimizers.CGD(G, D, criterion, 'MLP', torch.tensor([0.01]))
+    for N in (10, 10, 10):
+        optimizer.step(lambda: (torch.randn(N, 8), N))
+    assert sorted(built) == [('ones', 10), ('zeros', 10)]
+    assert utils.cached_target('ones', 10, 'cpu') is ones
+    # a new batch size gets its own targets
+    optimizer.step(lambda: (torch.randn(6, 8), 6))
+    assert sorted(built[2:]) == [('ones', 6), ('zeros', 6)]
+    assert utils.cached_target('ones', 6, 'cpu').shape == (6, 1)
+    assert utils.cached_target('ones', 10, 'cpu') is ones
+
+
+def test_precision_policy_redoes_non_finite_steps(monkeypatch):
+    # the scaled bfloat16 loss overflows, the unscaled one does not
+    policy = utils.PrecisionPolicy(loss_scale=1e39)
+    redone = []
+    step = optimizers.CGD.full_precision_step
+
+    def counted(self, *args):
+        redone.append(self.precision.enabled)
+        return step(self, *args)
+
+    monkeypatch.setattr(optimizers.CGD, 'full_precision_step', counted)
+    updates = []
+    for precision in (None, policy):
+        torch.manual_seed(0)
+        G = Generator().to(torch.device('cpu'))
+        D = Discriminator().to(torch.device('cpu'))
+        optimizer = optimizers.CGD(
+            G,
+            D,
+            torch.nn.BCEWithLogitsLoss(),
+            'MLP',
+            torch.tensor([0.01]),
+            precision=precision,
+        )
+        torch.manual_seed(1)
+        real_data = torch.randn(10, 8)
+        if precision is None:
+            # the noise drawn by the discarded bfloat16 attempt
+            torch.randn(10, 100)
+        updates.append(optimizer.update(real_data, 10))
+    full, fallback = updates
+    assert redone == [True]
+    assert policy.fallbacks == 1 and policy.loss_scale == 5e38
+    assert policy.enabled
+    assert full[:3] == pytest.approx(fallback[:3], abs=1e-6)
+    for p, q in zip(full[3:], fallback[3:]):
+        assert torch.allclose(p, q, atol=1e-6)
@@ -0,0 +1,256 @@
+import pytest
+import torch
+
+import utils
+from conftest import DenseOperator
+
+
+def test_hutchinson_on_badly_scaled_system():
+    torch.manual_seed(0)
+    n = 100
+    C = torch.randn(n, n, dtype=torch.float64) * 0.05
+    A = (
+        torch.eye(n, dtype=torch.float64)
+        + torch.diag(torch.logspace(0, 3, n, dtype=torch.float64))
+        + C @ C.t()
+    )
+    b = torch.randn(n, dtype=torch.float64)
+    operator = DenseOperator(A)
+    _, plain = utils.conjugate_gradient(operator, b, nsteps=500)
+    preconditioner = utils.HutchinsonPreconditioner(n_probes=4)
+    preconditioner.update(operator)
+    x, preconditioned = utils.conjugate_gradient(
+        operator, b, nsteps=500, preconditioner=preconditioner
+    )
+    assert preconditioner.active
+    assert preconditioned < plain / 4
+    assert torch.allclose(A @ x, b, atol=1e-6)
+
+
+def test_hutchinson_off_on_dense_system(dense_system):
+    A, b = dense_system
+    preconditioner = utils.HutchinsonPreconditioner(n_probes=4)
+    preconditioner.update(DenseOperator(A))
+    assert not preconditioner.active
+    assert preconditioner.apply(b) is b
+    # without the guards the estimate is kept and slows CG down
+    operator = DenseOperator(A)
+    _, plain = utils.conjugate_gradient(operator, b, nsteps=500)
+    forced = utils.HutchinsonPreconditioner(
+        n_probes=4, max_noise=float('inf'), min_spread=1.0
+    )
+    forced.update(operator)
+    _, preconditioned = utils.conjugate_gradient(
+        operator, b, nsteps=500, preconditioner=forced
+    )
+    assert forced.active
+    assert preconditioned > plain
+
+
+def test_chebyshev_converges_with_a_valid_bound(dense_system):
+    A, b = dense_system
+    lambda_max = torch.linalg.eigvalsh(A)[-1].item()
+    x, sweeps, converged = utils.chebyshev(
+        DenseOperator(A), b, nsteps=60, lambda_max=1.01 * lambda_max
+    )
+    assert converged and sweeps == 60
+    assert torch.allclose(x, torch.linalg.solve(A, b), atol=1e-6)
+
+
+def test_chebyshev_flags_an_underestimated_bound(dense_system):
+    A, b = dense_system
+    lambda_max = torch.linalg.eigvalsh(A)[-1].item()
+    _, _, converged = utils.chebyshev(
+        DenseOperator(A),
+        b,
+        nsteps=20,
+        lambda_max=0.5 * lambda_max,
+        max_restarts=0,
+    )
+    assert not converged
+
+
+def count_syncs(monkeypatch):
+    '''
+    Counts the tensor-to-bool conversions, each a host synchronization
+    '''
+    counter = {'syncs': 0}
+    to_bool = torch.Tensor.__bool__
+
+    def counted(self):
+        counter['syncs'] += 1
+        return to_bool(self)
+
+    monkeypatch.setattr(torch.Tensor, '__bool__', counted)
+    return counter
+
+
+def test_single_reduction_cg_checks_every(dense_system, monkeypatch):
+    A, b = dense_system
+    operator = DenseOperator(A)
+    reference = torch.linalg.solve(A, b)
+    counter = count_syncs(monkeypatch)
+    solutions = {}
+    for check_every in (1, 10):
+        counter['syncs'] = 0
+        x, iterations = utils.single_reduction_conjugate_gradient(
+            operator, b, nsteps=200, check_every=check_every
+        )
+        solutions[check_every] = (x, iterations, counter['syncs'])
+        assert torch.allclose(x, reference, atol=1e-6)
+    x_1, iterations_1, syncs_1 = solutions[1]
+    x_10, iterations_10, syncs_10 = solutions[10]
+    # the iterations past convergence are no-ops
+    assert iterations_1 == iterations_10
+    assert torch.equal(x_1, x_10)
+    assert syncs_1 == iterations_1
+    assert syncs_10 <= iterations_1 // 10 + 1
+
+
+def test_cg_from_an_exact_warm_start(dense_system):
+    A, b = dense_system
+    x = torch.linalg.solve(A, b)
+    solution, iterations = utils.conjugate_gradient(
+        DenseOperator(A), A @ x, x=x.clone(), nsteps=10
+    )
+    assert iterations == 0
+    assert torch.equal(solution, x)
+
+
+def test_minres_before_gmres_on_symmetric_indefinite_system():
+    torch.manual_seed(0)
+    Q, _ = torch.linalg.qr(torch.randn(100, 100, dtype=torch.float64))
+    eigenvalues = torch.cat(
+        [torch.linspace(-2, -0.1, 30), torch.linspace(0.1, 3, 70)]
+    ).double()
+    A = Q @ torch.diag(eigenvalues) @ Q.t()
+    b = torch.randn(100, dtype=torch.float64)
+    iterations = {}
+    for solve in (utils.minres, utils.gmres):
+        x, iterations[solve], _ = solve(
+            DenseOperator(A), b, nsteps=1000, residual_tol=1e-10
+        )
+        assert torch.norm(A @ x - b) <= 1e-4 * torch.norm(b)
+    assert iterations[utils.minres] <= 100
+    assert iterations[utils.gmres] > 3 * iterations[utils.minres]
+
+
+@pytest.mark.parametrize(
+    'dtype, tolerance', [(torch.float32, 1e-4), (torch.float64, 1e-8)]
+)
+def test_nystrom_solves_low_rank_plus_identity(dense_system, dtype, tolerance):
+    A, b = dense_system
+    # A - I has rank 10
+    for rank in (10, 15):
+        nystrom = utils.NystromApproximation(rank=rank)
+        assert nystrom.update(DenseOperator(A.to(dtype))) == rank
+        x = nystrom.apply(b.to(dtype))
+        assert x.dtype == dtype
+        residual = torch.norm(A @ x.double() - b) / torch.norm(b)
+        assert residual < tolerance
+
+
+def test_recycled_cg_deflates_the_next_solves(dense_system):
+    A, _ = dense_system
+    operator = DenseOperator(A)
+    recycler = utils.KrylovRecycler(k=5, m=10)
+    iterations = []
+    for _ in range(3):
+        b = torch.randn(60, dtype=torch.float64)
+        x, steps = utils.deflated_conjugate_gradient(
+            operator, b, recycler, nsteps=200
+        )
+        iterations.append(steps)
+        assert torch.allclose(A @ x, b, atol=1e-6)
+    # the 5 largest eigenvectors of the rank 10 term are deflated
+    assert max(iterations[1:]) < iterations[0]
+
+
+@pytest.mark.parametrize('solve', [utils.minres, utils.gmres])
+def test_newton_solver_on_dense_system(dense_system, solve):
+    A, b = dense_system
+    x, _, _ = solve(DenseOperator(A), b, nsteps=200)
+    assert torch.allclose(A @ x, b, atol=1e-6)
+
+
+@pytest.mark.parametrize('sketch', ['gaussian', 'srht'])
+def test_sketch_preconditioner_cuts_cg_iterations(sketch):
+    torch.manual_seed(0)
+    n = 300
+    Q, _ = torch.linalg.qr(torch.randn(n, n, dtype=torch.float64))
+    # identity plus a PSD term of fast decaying spectrum, condition 1e4
+    eigenvalues = 1e4 * 0.7 ** torch.arange(n, dtype=torch.float64)
+    A = torch.eye(n, dtype=torch.float64) + Q @ torch.diag(eigenvalues) @ Q.t()
+    b = torch.randn(n, dtype=torch.float64)
+    operator = DenseOperator(A)
+    _, plain = utils.conjugate_gradient(operator, b, nsteps=1000)
+    preconditioner = utils.SketchPreconditioner(rank=20, sketch=sketch)
+    preconditioner.update(operator)
+    x, preconditioned = utils.conjugate_gradient(
+        operator, b, nsteps=1000, preconditioner=preconditioner
+    )
+    assert preconditioned < plain / 3
+    assert torch.norm(A @ x - b) < 1e-6 * torch.norm(b)
+
+
+def test_lanczos_top_eigenvalue_on_dense_system():
+    torch.manual_seed(0)
+    B = torch.randn(200, 200)
+    A = B @ B.t() / 200
+    top = torch.linalg.eigvalsh(A.double())[-1].item()
+    ritz = utils.lanczos(lambda vec: A @ vec, 200, 'cpu', n_iterations=20)
+    assert ritz[-1].item() == pytest.approx(top, rel=1e-4)
+
+
+class DenseMixedOperator(object):
+    '''
+    Blocks D_xx, D_xy = D_yx^T and D_yy of a dense symmetric matrix
+    '''
+
+    def __init__(self, xx, xy, yy):
+        self.xx, self.xy, self.yy = xx, xy, yy
+        self.n_x, self.n_y = xy.shape
+        self.device_x = self.device_y = xy.device
+
+    def D_xx(self, vec):
+        return self.xx @ vec
+
+    def D_yy(self, vec):
+        return self.yy @ vec
+
+    def D_xy(self, vec):
+        return self.xy @ vec
+
+    def D_yx(self, vec):
+        return self.xy.t() @ vec
+
+
+def symmetric_with_outliers(n, low, high):
+    '''
+    Random symmetric matrix with eigenvalues low and high apart from a
+    bulk in [-1, 1]
+    '''
+    Q, _ = torch.linalg.qr(torch.randn(n, n))
+    eigenvalues = torch.cat(
+        [torch.tensor([low, high]), torch.rand(n - 2) * 2 - 1]
+    )
+    return Q @ torch.diag(eigenvalues) @ Q.t()
+
+
+def test_spectral_estimator_matches_dense_eigenvalues():
+    torch.manual_seed(0)
+    operator = DenseMixedOperator(
+        symmetric_with_outliers(50, -8.0, 5.0),
+        torch.randn(50, 40) / 7,
+        symmetric_with_outliers(40, -3.0, 6.0),
+    )
+    estimator = utils.SpectralEstimator(n_iterations=20)
+    estimator.update(operator)
+    estimates = estimator.estimates
+    cross = torch.linalg.eigvalsh((operator.xy @ operator.xy.t()).double())
+    assert estimates['cross'] == pytest.approx(cross[-1].item(), rel=1e-4)
+    for name, block in (('xx', operator.xx), ('yy', operator.yy)):
+        eigenvalues = torch.linalg.eigvalsh(block.double())
+        assert estimates[name] == pytest.approx(
+            (eigenvalues[0].item(), eigenvalues[-1].item()), rel=1e-4
+        )
@@ -9,6 +9,11 @@
 '''
 ##########################################
 import os
+import math
+import time
+import json
+import contextlib
+import collections
 import numpy as np
 from matplotlib import pyplot as plt
 import torch
@@ -17,6 +22,13 @@ from torch import nn
 from torch.autograd.variable import Variable
 from mpi4py import MPI
 
+try:
+    from torch.func import functional_call
+    from torch.func import grad as func_grad
+    from torch.func import jvp as func_jvp
+except ImportError:
+    functional_call = None
+
 if torch.cuda.is_available():
     import pycuda
     from pycuda import compiler
@@ -77,6 +89,76 @@ def zeros_target_smooth(size):
     return data
 
 
+class TargetCache(object):
+    def __init__(self, size=32):
+        """
+        Bounded LRU cache of the constant label tensors fed to the criterion,
+        keyed by (kind, N, device, dtype). Each target is built once directly
+        where it is used, so steady-state training neither allocates targets
+        nor copies them from the host. Cached tensors are shared between
+        calls and must not be modified in place.
+
+        :param size: maximum number of cached targets
+        """
+        self.size = size
+        self.targets = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.targets)
+
+    def build(self, kind, N, device, dtype):
+        '''
+        Allocates the target `kind` of batch size N on device
+        '''
+        if kind == 'ones':
+            return torch.ones(N, 1, device=device, dtype=dtype)
+        elif kind == 'zeros':
+            return torch.zeros(N, 1, device=device, dtype=dtype)
+        elif kind == 'ones_resnet':
+            return torch.ones(N, device=device, dtype=dtype)
+        elif kind == 'zeros_resnet':
+            return torch.zeros(N, device=device, dtype=dtype)
+        elif kind == 'ones_smooth':
+            return torch.full((N,), 0.9, device=device, dtype=dtype)
+        elif kind == 'zeros_smooth':
+            return torch.full((N,), 0.1, device=device, dtype=dtype)
+        else:
+            raise RuntimeError('Target kind not recognized')
+
+    def get(self, kind, N, device='cpu', dtype=None):
+        """
+        Returns the cached target, building it on a miss and evicting the
+        least recently used entry once the cache is full.
+
+        :param kind: 'ones', 'zeros', their '_resnet' and '_smooth' variants
+        :param N: batch size
+        :param device: device the target lives on
+        :param dtype: data type, default dtype of torch when None
+        """
+        if dtype is None:
+            dtype = torch.get_default_dtype()
+        key = (kind, N, torch.device(device), dtype)
+        target = self.targets.get(key)
+        if target is None:
+            target = self.build(kind, N, device, dtype)
+            self.targets[key] = target
+            if len(self.targets) > self.size:
+                self.targets.popitem(last=False)
+        else:
+            self.targets.move_to_end(key)
+        return target
+
+
+target_cache = TargetCache()
+
+
+def cached_target(kind, N, device='cpu', dtype=None):
+    '''
+    Target `kind` of batch size N on device, shared through target_cache
+    '''
+    return target_cache.get(kind, N, device, dtype)
+
+
 def noise(size, noise_size):
     '''
     Generates a 1-d vector of gaussian sampled random values
@@ -165,6 +247,34 @@ def zero_grad(params):
             p.grad.zero_()
 
 
+class ParameterArena(object):
+    def __init__(self, model):
+        """
+        Parameters of model moved into one contiguous buffer, the module
+        tensors becoming views of it, so that the flattened parameters are
+        self.data without a copy and an update of all of them is a single
+        add_. The gradients are left alone: those of the competitive
+        updates carry a graph, which torch.cat(out=...) cannot write, and
+        the torch optimizers reset .grad to None. Build it after the model
+        has been moved to its device: Module.to reallocates the parameters.
+
+        :param model: torch.nn.Module whose parameters share dtype and device
+        """
+        self.params = list(model.parameters())
+        self.sizes = [p.numel() for p in self.params]
+        self.data = torch.cat([p.detach().reshape(-1) for p in self.params])
+        for p, data in zip(self.params, torch.split(self.data, self.sizes)):
+            p.data = data.view_as(p)
+
+    def add_(self, vec):
+        """
+        Adds the flattened update vec to all the parameters
+        """
+        if vec.numel() != self.data.numel():
+            raise RuntimeError('Size mismatch')
+        self.data.add_(vec.to(self.data.device))
+
+
 def weights_init_normal(m):
     classname = m.__class__.__name__
     if classname.find("Conv") != -1:
@@ -174,39 +284,159 @@ def weights_init_normal(m):
         torch.nn.init.constant_(m.bias.data, 0.0)
 
 
-def Hvp_vec(grad_vec, params, vec, retain_graph=False):
-    if torch.isnan(grad_vec).any():
-        print('grad vec nan')
-        raise ValueError('grad Nan')
-    if torch.isnan(vec).any():
-        print('vec nan')
-        raise ValueError('vec Nan')
-    try:
-        grad_grad = autograd.grad(
-            grad_vec, params, grad_outputs=vec, retain_graph=retain_graph
-        )
-        hvp = torch.cat([g.contiguous().view(-1) for g in grad_grad])
-        if torch.isnan(hvp).any():
-            print('hvp nan')
-            raise ValueError('hvp Nan')
-    except:
-        # print('filling zero for None')
-        grad_grad = autograd.grad(
-            grad_vec,
-            params,
-            grad_outputs=vec,
-            retain_graph=retain_graph,
-            allow_unused=True,
-        )
-        grad_list = []
-        for i, p in enumerate(params):
-            if grad_grad[i] is None:
-                grad_list.append(torch.zeros_like(p))
+class HealthMonitor(object):
+    def __init__(self, every=1):
+        """
+        NaN/Inf flags of the Hessian-vector products, accumulated on the
+        device and checked with a single host synchronization every `every`
+        optimizer steps instead of after each product.
+
+        :param every: number of optimizer steps between two checks
+        """
+        self.every = every
+        self.flags = {}
+        self.count = 0
+
+    def record(self, name, tensor):
+        '''
+        Flags `name` if tensor holds a non-finite value, without synchronizing
+        '''
+        bad = ~torch.isfinite(tensor).all()
+        if name in self.flags:
+            self.flags[name].logical_or_(bad)
+        else:
+            self.flags[name] = bad
+
+    def merge(self, other):
+        '''
+        Adds the flags of other, e.g. the monitor of a solve run in another
+        thread, without synchronizing
+        '''
+        for name, bad in other.flags.items():
+            if name in self.flags:
+                flag = self.flags[name]
+                self.flags[name] = flag.logical_or(bad.to(flag.device))
             else:
-                grad_list.append(grad_grad[i].contiguous().view(-1))
-        hvp = torch.cat(grad_list)
-        if torch.isnan(hvp).any():
-            raise ValueError('hvp Nan')
+                self.flags[name] = bad
+
+    def check(self):
+        '''
+        Called once per optimizer step; raises ValueError naming the
+        operators that produced a non-finite value since the last check
+        '''
+        self.count += 1
+        if not self.flags or self.count % self.every:
+            return
+        names = list(self.flags)
+        device = self.flags[names[0]].device
+        flags = torch.stack([self.flags[n].to(device) for n in names])
+        self.flags = {}
+        bad = [n for n, flag in zip(names, flags.tolist()) if flag]
+        if bad:
+            print('non-finite values in ' + ', '.join(bad))
+            raise ValueError(', '.join(bad) + ' Nan')
+
+
+class PrecisionPolicy(object):
+    def __init__(
+        self,
+        compute_dtype=torch.bfloat16,
+        solve_dtype=torch.float64,
+        loss_scale=1.0,
+        growth_interval=None,
+    ):
+        """
+        Precision of a competitive step: forward, backward and Hessian-vector
+        products run under autocast to compute_dtype, while the CG vectors
+        and inner products are carried in solve_dtype. A step whose
+        gradients are not finite halves the loss scale and is redone in
+        full precision.
+
+        :param compute_dtype: autocast dtype, bfloat16 or float16
+        :param solve_dtype: dtype of the linear solve
+        :param loss_scale: factor of the losses before differentiation,
+                           needed by float16 only
+        :param growth_interval: number of finite steps after which the loss
+                                scale doubles, never if None
+        """
+        self.compute_dtype = compute_dtype
+        self.solve_dtype = solve_dtype
+        self.loss_scale = loss_scale
+        self.growth_interval = growth_interval
+        self.enabled = True
+        self.finite_steps = 0
+        self.fallbacks = 0
+
+    def autocast(self, device):
+        return torch.autocast(
+            device_type=torch.device(device).type,
+            dtype=self.compute_dtype,
+            enabled=self.enabled,
+        )
+
+    def scale(self, loss):
+        return loss * self.loss_scale if self.enabled else loss
+
+    def unscale(self, grad_vec):
+        return grad_vec / self.loss_scale if self.enabled else grad_vec
+
+    def check(self, *grad_vecs):
+        '''
+        One host synchronization per step on the finiteness of the
+        gradients; False if the step must be redone in full precision
+        '''
+        if not self.enabled:
+            return True
+        finite = bool(
+            torch.stack(
+                [
+                    torch.isfinite(g).all().to(grad_vecs[0].device)
+                    for g in grad_vecs
+                ]
+            ).all()
+        )
+        if finite:
+            self.finite_steps += 1
+            if (
+                self.growth_interval is not None
+                and self.finite_steps % self.growth_interval == 0
+            ):
+                self.loss_scale *= 2
+            return True
+        self.loss_scale /= 2
+        self.finite_steps = 0
+        self.fallbacks += 1
+        return False
+
+
+def Hvp_vec(
+    grad_vec, params, vec, retain_graph=False, monitor=None, name='hvp'
+):
+    '''
+    Product of the derivative of grad_vec w.r.t. params with vec; parameters
+    that do not appear in the graph of grad_vec contribute zeros.
+
+    :param monitor: HealthMonitor recording non-finite values of the
+                    product under `name`
+    '''
+    params = tuple(params)
+    grad_grad = autograd.grad(
+        grad_vec,
+        params,
+        grad_outputs=vec,
+        retain_graph=retain_graph,
+        allow_unused=True,
+    )
+    hvp = torch.cat(
+        [
+            torch.zeros(p.numel(), dtype=vec.dtype, device=vec.device)
+            if g is None
+            else g.contiguous().view(-1)
+            for g, p in zip(grad_grad, params)
+        ]
+    )
+    if monitor is not None:
+        monitor.record(name, hvp)
     return hvp
 
 
@@ -222,68 +452,1167 @@ def hessian_vec(grad_vec, var, retain_graph=False):
     return vec
 
 
+@contextlib.contextmanager
+def split_batch_norm(model, split):
+    '''
+    Within the context, the BatchNorm layers of model in training mode
+    normalize the first `split` samples of a batch and the remaining ones
+    separately, each with its own statistics, and update their running
+    statistics once per part: a forward pass on two concatenated batches
+    then gives the results of two separate passes.
+
+    :param model: torch.nn.Module
+    :param split: number of samples of the first batch
+    '''
+    modules = [
+        m
+        for m in model.modules()
+        if isinstance(m, nn.modules.batchnorm._BatchNorm) and m.training
+    ]
+    for m in modules:
+
+        def forward(input, m=m):
+            return torch.cat(
+                [
+                    type(m).forward(m, input[:split]),
+                    type(m).forward(m, input[split:]),
+                ]
+            )
+
+        m.forward = forward
+    try:
+        yield
+    finally:
+        for m in modules:
+            del m.forward
+
+
+def module_blocks(model):
+    '''
+    Parameters of model grouped by layer: one group per child module with
+    parameters, nn.Sequential containers being split into their children
+    (so that e.g. every ResBlock2d of GeneratorResnet is a group), and one
+    group for the parameters of model itself
+
+    :param model: torch.nn.Module
+    :return: list of lists of parameters
+    '''
+    blocks = []
+    own = list(model.parameters(recurse=False))
+    if own:
+        blocks.append(own)
+    for child in model.children():
+        if isinstance(child, nn.Sequential):
+            blocks.extend(module_blocks(child))
+        else:
+            params = list(child.parameters())
+            if params:
+                blocks.append(params)
+    return blocks
+
+
+def pair_blocks(x_blocks, y_blocks):
+    '''
+    Pairs the parameter blocks of the two players: both lists are merged
+    into min(len(x_blocks), len(y_blocks)) groups of consecutive blocks and
+    the i-th group of x is paired with the i-th group of y
+
+    :return: list of (x parameters, y parameters)
+    '''
+    n = min(len(x_blocks), len(y_blocks))
+
+    def merge(blocks):
+        return [
+            sum(blocks[len(blocks) * i // n : len(blocks) * (i + 1) // n], [])
+            for i in range(n)
+        ]
+
+    return list(zip(merge(x_blocks), merge(y_blocks)))
+
+
+class MixedHessianOperator(object):
+    def __init__(
+        self,
+        grad_x,
+        grad_y,
+        x_params,
+        y_params,
+        lr_x,
+        lr_y,
+        device_x=torch.device('cpu'),
+        device_y=torch.device('cpu'),
+    ):
+        """
+        Matrix-free access to the blocks of the game Hessian, built once per
+        optimizer step from the retained gradient graph.
+
+        :param grad_x: flattened gradient w.r.t. x_params (with create_graph)
+        :param grad_y: flattened gradient w.r.t. y_params (with create_graph)
+        :param x_params: parameters of the first player
+        :param y_params: parameters of the second player
+        :param lr_x: learning rate of the first player (scalar or vector)
+        :param lr_y: learning rate of the second player (scalar or vector)
+        :param device_x: device of the first player
+        :param device_y: device of the second player
+
+        The products returned by D_xx, D_xy, D_yx, D_yy and matvec are
+        written into preallocated buffers: they are overwritten by the next
+        call that fills the same buffer, so clone them if they must be kept.
+        """
+        self.grad_x = grad_x.to(device_x)
+        self.grad_y = grad_y.to(device_y)
+        # D_xy differentiates grad_y w.r.t. x_params: keep one copy of
+        # grad_y on the x device instead of moving it at every product
+        self.grad_y_on_x = grad_y.to(device_x)
+        self._setup(
+            x_params, y_params, lr_x, lr_y, device_x, device_y, grad_x.dtype
+        )
+        # Parameters that do not appear in a gradient graph are resolved on
+        # the first product and replaced by cached zeros afterwards
+        self._zeros = {}
+
+    def _setup(
+        self, x_params, y_params, lr_x, lr_y, device_x, device_y, dtype
+    ):
+        self.device_x = device_x
+        self.device_y = device_y
+        self.dtype = dtype
+        self.x_params = tuple(x_params)
+        self.y_params = tuple(y_params)
+        self.lr_x = lr_x.to(device_x)
+        self.lr_y = lr_y.to(device_y)
+        self.sqrt_lr_x = self.lr_x.sqrt()
+        self.batched = True
+        # HealthMonitor recording the products, set by the optimizer
+        self.monitor = None
+
+        self.n_x = sum(p.numel() for p in self.x_params)
+        self.n_y = sum(p.numel() for p in self.y_params)
+        self._out_x = torch.empty(self.n_x, dtype=dtype, device=device_x)
+        self._out_y = torch.empty(self.n_y, dtype=dtype, device=device_y)
+        self._scaled_x = torch.empty_like(self._out_x)
+        self._Avp = torch.empty_like(self._out_x)
+
+    def _product(self, key, grad_vec, params, vec, out):
+        grad_grad = autograd.grad(
+            grad_vec,
+            params,
+            grad_outputs=vec,
+            retain_graph=True,
+            allow_unused=True,
+        )
+        zeros = self._zeros.get(key)
+        if zeros is None:
+            zeros = [
+                torch.zeros(p.numel(), dtype=out.dtype, device=out.device)
+                if g is None
+                else None
+                for g, p in zip(grad_grad, params)
+            ]
+            self._zeros[key] = zeros
+        torch.cat(
+            [
+                z if g is None else g.reshape(-1)
+                for g, z in zip(grad_grad, zeros)
+            ],
+            out=out,
+        )
+        if self.monitor is not None:
+            self.monitor.record('D_' + key, out)
+        return out
+
+    def D_xx(self, vec):
+        '''
+        D_xx * vec
+        '''
+        return self._product(
+            'xx',
+            self.grad_x,
+            self.x_params,
+            vec.to(self.device_x, self.dtype),
+            self._out_x,
+        )
+
+    def D_xy(self, vec):
+        '''
+        D_xy * vec, with vec living in the space of y_params
+        '''
+        return self._product(
+            'xy',
+            self.grad_y_on_x,
+            self.x_params,
+            vec.to(self.device_x, self.dtype),
+            self._out_x,
+        )
+
+    def D_yx(self, vec):
+        '''
+        D_yx * vec, with vec living in the space of x_params
+        '''
+        return self._product(
+            'yx',
+            self.grad_x,
+            self.y_params,
+            vec.to(self.device_x, self.dtype),
+            self._out_y,
+        )
+
+    def D_yy(self, vec):
+        '''
+        D_yy * vec
+        '''
+        return self._product(
+            'yy',
+            self.grad_y,
+            self.y_params,
+            vec.to(self.device_y, self.dtype),
+            self._out_y,
+        )
+
+    def matvec(self, vec):
+        '''
+        (I + sqrt(lr_x) * D_xy * lr_y * D_yx * sqrt(lr_x)) * vec
+        '''
+        torch.mul(self.sqrt_lr_x, vec.to(self.dtype), out=self._scaled_x)
+        h_1 = self.D_yx(self._scaled_x).mul_(self.lr_y)
+        # lr_y * D_yx * sqrt(lr_x) * vec
+        h_2 = self.D_xy(h_1).mul_(self.sqrt_lr_x)
+        # sqrt(lr_x) * D_xy * lr_y * D_yx * sqrt(lr_x) * vec
+        if vec.dtype != self.dtype:
+            # a solve carried in higher precision gets its own copy
+            return vec + h_2
+        return torch.add(vec, h_2, out=self._Avp)
+
+    __matmul__ = matvec
+
+    def joint_product(self, vec_x, vec_y):
+        '''
+        (D_yx * vec_x, D_xy * vec_y) from a single traversal of the graph of
+        grad_x and grad_y, batching the two vectors (is_grads_batched).
+        Falls back to two products if the graph does not support batching.
+        '''
+        if self.batched:
+            vec_x = vec_x.to(self.device_x, self.dtype)
+            vec_y = vec_y.to(self.device_y, self.dtype)
+            try:
+                grad_grad = autograd.grad(
+                    (self.grad_x, self.grad_y),
+                    self.x_params + self.y_params,
+                    grad_outputs=(
+                        torch.stack([vec_x, torch.zeros_like(vec_x)]),
+                        torch.stack([torch.zeros_like(vec_y), vec_y]),
+                    ),
+                    retain_graph=True,
+                    allow_unused=True,
+                    is_grads_batched=True,
+                )
+            except RuntimeError as error:
+                print(
+                    'Batched Hessian products not supported, '
+                    'falling back to separate products:',
+                    error,
+                )
+                self.batched = False
+            else:
+                n_x = len(self.x_params)
+                # the first vector multiplies grad_x, so its D_yx part is
+                # in the y block; the second one multiplies grad_y
+                torch.cat(
+                    [
+                        torch.zeros_like(p).view(-1)
+                        if g is None
+                        else g[0].reshape(-1)
+                        for g, p in zip(grad_grad[n_x:], self.y_params)
+                    ],
+                    out=self._out_y,
+                )
+                torch.cat(
+                    [
+                        torch.zeros_like(p).view(-1)
+                        if g is None
+                        else g[1].reshape(-1)
+                        for g, p in zip(grad_grad[:n_x], self.x_params)
+                    ],
+                    out=self._out_x,
+                )
+                if self.monitor is not None:
+                    self.monitor.record('D_yx', self._out_y)
+                    self.monitor.record('D_xy', self._out_x)
+                return self._out_y, self._out_x
+        # D_yx and D_xy fill different buffers
+        return self.D_yx(vec_x), self.D_xy(vec_y)
+
+    def transpose(self):
+        '''
+        Operator of the same game seen from the second player
+        '''
+        operator = MixedHessianOperator(
+            self.grad_y,
+            self.grad_x,
+            self.y_params,
+            self.x_params,
+            self.lr_y,
+            self.lr_x,
+            device_x=self.device_y,
+            device_y=self.device_x,
+        )
+        operator.monitor = self.monitor
+        return operator
+
+
+class ForwardMixedHessianOperator(MixedHessianOperator):
+    def __init__(
+        self,
+        loss_x,
+        loss_y,
+        x_params,
+        y_params,
+        lr_x,
+        lr_y,
+        device_x=torch.device('cpu'),
+        device_y=torch.device('cpu'),
+    ):
+        """
+        MixedHessianOperator evaluating the products forward-over-reverse
+        (torch.func.jvp of torch.func.grad), so that the first gradients do
+        not need create_graph and no double-backward graph is kept alive.
+
+        :param loss_x: loss_x(x_params, y_params), the cost whose gradient
+                       w.r.t. x_params is grad_x
+        :param loss_y: loss_y(x_params, y_params), the cost whose gradient
+                       w.r.t. y_params is grad_y
+        The other parameters are the ones of MixedHessianOperator.
+        """
+        if functional_call is None:
+            raise RuntimeError('Forward-mode products require torch.func')
+        self.loss_x = loss_x
+        self.loss_y = loss_y
+        x_params = tuple(p.detach() for p in x_params)
+        y_params = tuple(p.detach() for p in y_params)
+        self._setup(
+            x_params,
+            y_params,
+            lr_x,
+            lr_y,
+            device_x,
+            device_y,
+            x_params[0].dtype,
+        )
+        # there is no reverse graph to batch over, see joint_product
+        self.batched = False
+
+    def _forward_product(self, loss, argnums, along, vec, out):
+        # d/de grad_{argnums} loss(params + e * vec), vec along x (0) or y (1)
+        primals = [self.x_params, self.y_params]
+        tangent = tuple(
+            v.view_as(p)
+            for v, p in zip(
+                vec.split([p.numel() for p in primals[along]]),
+                primals[along],
+            )
+        )
+
+        def gradient(moving):
+            primals[along] = moving
+            return func_grad(loss, argnums=argnums)(*primals)
+
+        _, hvp = func_jvp(gradient, (primals[along],), (tangent,))
+        torch.cat([h.reshape(-1) for h in hvp], out=out)
+        if self.monitor is not None:
+            self.monitor.record('D_' + 'xy'[argnums] + 'xy'[along], out)
+        return out
+
+    def D_xx(self, vec):
+        return self._forward_product(
+            self.loss_x, 0, 0, vec.to(self.device_x, self.dtype), self._out_x
+        )
+
+    def D_xy(self, vec):
+        return self._forward_product(
+            self.loss_y, 0, 1, vec.to(self.device_y, self.dtype), self._out_x
+        )
+
+    def D_yx(self, vec):
+        return self._forward_product(
+            self.loss_x, 1, 0, vec.to(self.device_x, self.dtype), self._out_y
+        )
+
+    def D_yy(self, vec):
+        return self._forward_product(
+            self.loss_y, 1, 1, vec.to(self.device_y, self.dtype), self._out_y
+        )
+
+    def transpose(self):
+        loss_x, loss_y = self.loss_x, self.loss_y
+        operator = ForwardMixedHessianOperator(
+            lambda y, x: loss_y(x, y),
+            lambda y, x: loss_x(x, y),
+            self.y_params,
+            self.x_params,
+            self.lr_y,
+            self.lr_x,
+            device_x=self.device_y,
+            device_y=self.device_x,
+        )
+        operator.monitor = self.monitor
+        return operator
+
+
 def binary_cross_entropy(x, y):
     loss = -(x.log() * y + (1 - x).log() * (1 - y))
     return loss.mean()
 
 
 class Richardson(object):
-    def __init__(self, matrix, rhs, tol, maxiter, relaxation, verbose=False):
+    def __init__(
+        self,
+        matrix,
+        rhs,
+        tol,
+        maxiter,
+        relaxation=None,
+        verbose=False,
+        lambda_min=None,
+        lambda_max=None,
+    ):
         """
-        :param matrix: coefficient matrix
-        :param rhs: right hand side
+        :param matrix: coefficient matrix, or a callable returning
+                       matrix * vec (e.g. MixedHessianOperator.matvec)
+        :param rhs: right hand side, or a batch of right hand sides stored
+                    as the columns of a 2D tensor
         :param tol: tolerance for stopping criterion based on the relative residual
         :param maxiter: maximum number of iterations
-        :param relaxation: relaxation parameter for Richardson
-        :param initial_guess: initial guess
-        :return: matrix ** -1 * rhs
+        :param relaxation: relaxation parameter for Richardson, optimal for
+                           the bounds lambda_min, lambda_max if None
+        :param lambda_min: lower bound of the spectrum of matrix
+        :param lambda_max: upper bound of the spectrum of matrix
         """
 
         self.rhs = rhs
         self.matrix = matrix
         self.tol = tol
         self.maxiter = maxiter
+        if relaxation is None:
+            if lambda_min is None or lambda_max is None:
+                raise ValueError(
+                    'Richardson: relaxation or eigenvalue bounds required'
+                )
+            # minimizes the contraction factor max |1 - relaxation * lambda|
+            relaxation = 2 / (float(lambda_min) + float(lambda_max))
         self.relaxation = relaxation
-        self.rhs_norm = torch.norm(rhs, 2)
+        self.rhs_norm = torch.norm(rhs, 2, dim=0)
         self.iteration_count = 0
+        self.stats = None
         self.verbose = verbose
 
     def print_verbose(self, *args, **kwargs):
         if self.verbose:
             print(*args, **kwargs)
 
-    def solve(self, initial_guess):
-        ## TODO: consider passing initial guess to solve()
-
-        residual = self.rhs - self.matrix @ initial_guess
-        residual_norm = residual.norm()
-        relative_residual_norm = residual_norm / self.rhs_norm
-
-        solution = initial_guess
-
-        while (
-            relative_residual_norm > self.tol
-            and self.iteration_count < self.maxiter
-        ):
-            ## TODO: consider making all of these non-attributes and just return them
-            solution = solution + self.relaxation * residual
-
-            residual = self.rhs - torch.matmul(self.matrix, solution)
-            residual_norm = residual.norm()
-            relative_residual_norm = residual_norm / self.rhs_norm
+    def apply(self, vec):
+        """
+        matrix * vec, column by column for a callable and a batch; each
+        product is copied out at once since a callable may return the same
+        buffer every time (MixedHessianOperator.matvec)
+        """
+        if not callable(self.matrix):
+            return torch.matmul(self.matrix, vec)
+        if vec.dim() == 1:
+            return self.matrix(vec)
+        product = torch.empty_like(vec)
+        for i, column in enumerate(vec.unbind(1)):
+            product[:, i] = self.matrix(column)
+        return product
+
+    def solve(self, initial_guess=None):
+        """
+        :param initial_guess: initial guess, zero if None
+        :return: matrix ** -1 * rhs; the statistics of the solve (iterations,
+                 relative residual of every right hand side, convergence,
+                 history of the largest relative residual, relaxation)
+                 are kept in self.stats
+        """
+        self.iteration_count = 0
+        if initial_guess is None:
+            solution = torch.zeros_like(self.rhs)
+            residual = self.rhs.clone()
+        else:
+            solution = initial_guess.clone()
+            residual = self.rhs - self.apply(solution)
+        relative_residual_norm = residual.norm(dim=0) / self.rhs_norm
+        history = [float(relative_residual_norm.max())]
+
+        while history[-1] > self.tol and self.iteration_count < self.maxiter:
+            # right hand sides that have converged are not updated
+            active = (relative_residual_norm > self.tol).to(residual.dtype)
+            solution = solution + self.relaxation * active * residual
+
+            residual = self.rhs - self.apply(solution)
+            relative_residual_norm = residual.norm(dim=0) / self.rhs_norm
+            history.append(float(relative_residual_norm.max()))
             self.iteration_count += 1
             self.print_verbose(
-                "Richardson converged in ",
+                "Richardson iteration ",
                 str(self.iteration_count),
-                " iteration with relative residual norm: ",
-                str(relative_residual_norm),
+                " relative residual norm: ",
+                str(history[-1]),
                 end='...',
             )
 
-        # Do not return because it's already an attribute
+        self.stats = {
+            'iterations': self.iteration_count,
+            'relative_residual': relative_residual_norm,
+            'converged': history[-1] <= self.tol,
+            'history': history,
+            'relaxation': self.relaxation,
+        }
         return solution
 
 
+class WarmStart(object):
+    def __init__(self, enabled=True, extrapolate=False):
+        """
+        Initial guesses for a linear solve repeated at every optimizer step.
+
+        :param enabled: if False, every solve starts from zero
+        :param extrapolate: extrapolate linearly from the last two solutions
+                            instead of reusing the last one
+        """
+        self.enabled = enabled
+        self.extrapolate = extrapolate
+        self.lr = None
+        self.last = None
+        self.previous = None
+
+    def reset(self):
+        self.last = None
+        self.previous = None
+
+    def guess(self, lr, size, device=torch.device('cpu')):
+        """
+        :param lr: learning rate of the system; a change discards the history
+        :param size: size of the unknown
+        :param device: device of the unknown
+        :return: initial guess, or None to start from zero
+        """
+        if not self.enabled:
+            return None
+        lr = torch.as_tensor(lr).detach().to('cpu')
+        if self.lr is None or not (
+            self.lr.shape == lr.shape and torch.equal(self.lr, lr)
+        ):
+            self.reset()
+            self.lr = lr.clone()
+        if self.last is None or self.last.shape[0] != size:
+            return None
+        if self.extrapolate and self.previous is not None:
+            return (2 * self.last - self.previous).to(device)
+        return self.last.clone().to(device)
+
+    def update(self, solution):
+        if not self.enabled:
+            return
+        self.previous = self.last
+        self.last = solution.detach().clone()
+
+    def state_dict(self):
+        return {'lr': self.lr, 'last': self.last, 'previous': self.previous}
+
+    def load_state_dict(self, state_dict):
+        self.lr = state_dict['lr']
+        self.last = state_dict['last']
+        self.previous = state_dict['previous']
+
+
+class SolverTelemetry(object):
+    def __init__(self, size=1000):
+        """
+        Ring buffer of one record per linear solve: iterations, initial and
+        final residual norms, time per operator application and the reason
+        the solve stopped ('converged', 'max_iterations' or 'time_budget').
+        Only the last `size` records are kept until flushed.
+
+        :param size: capacity of the buffer
+        """
+        self.records = collections.deque(maxlen=size)
+        self.count = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def record(
+        self,
+        solver,
+        iterations,
+        initial_residual,
+        final_residual,
+        elapsed,
+        products,
+        reason,
+    ):
+        """
+        Called by the solver at the end of a solve; the residuals may be
+        tensors, converted here once per solve.
+        """
+        self.count += 1
+        self.records.append(
+            {
+                'solve': self.count,
+                'solver': solver,
+                'iterations': iterations,
+                'initial_residual': float(initial_residual),
+                'final_residual': float(final_residual),
+                'time_per_product': elapsed / max(products, 1),
+                'reason': reason,
+            }
+        )
+
+    def flush(self, path):
+        """
+        Appends the buffered records to path, one JSON object per line, and
+        empties the buffer
+        """
+        with open(path, 'a') as f:
+            for record in self.records:
+                f.write(json.dumps(record) + '\n')
+        self.records.clear()
+
+
+class ForcingSchedule(object):
+    def __init__(
+        self,
+        eta_max=0.5,
+        eta_min=1e-8,
+        gamma=1.0,
+        exponent=0.5,
+        max_iterations=100,
+        time_budget=None,
+    ):
+        """
+        Inexact-Newton forcing terms for the competitive solve: the relative
+        residual target is eta = gamma * ||grad|| ** exponent clipped to
+        [eta_min, eta_max], so the solve tightens as the gradients vanish.
+
+        :param eta_max: loosest relative residual
+        :param eta_min: tightest relative residual
+        :param gamma: scale of the forcing term
+        :param exponent: power of the gradient norm
+        :param max_iterations: hard cap on the iterations of a solve
+        :param time_budget: wall-clock budget of a solve in seconds
+        """
+        self.eta_max = eta_max
+        self.eta_min = eta_min
+        self.gamma = gamma
+        self.exponent = exponent
+        self.max_iterations = max_iterations
+        self.time_budget = time_budget
+
+    def tolerance(self, grad_x, grad_y):
+        '''
+        :return: relative residual target for the gradients of both players
+        '''
+        grad_norm = math.sqrt(
+            float(grad_x.detach().norm()) ** 2
+            + float(grad_y.detach().norm()) ** 2
+        )
+        eta = self.gamma * grad_norm ** self.exponent
+        return min(self.eta_max, max(self.eta_min, eta))
+
+
+class HutchinsonPreconditioner(object):
+    def __init__(
+        self, n_probes=2, refresh=10, beta=0.9, max_noise=0.25, min_spread=2.0
+    ):
+        """
+        Diagonal preconditioner of the CG system estimated by Hutchinson
+        probing, diag(A) ~ E[z * A z] with Rademacher vectors z.
+
+        The error of one probe on entry i is sum_j!=i A_ij z_j, so the
+        estimate is only useful when A is close to diagonally dominant,
+        with a diagonal spread over orders of magnitude. On a dense system
+        the off-diagonal mass swamps the estimate and PCG takes more
+        iterations than plain CG; use the 'gaussian' or 'srht' sketches
+        there. To guard
+        against it, the probes are split in two halves whose estimates
+        must agree within max_noise, and the diagonal must span a factor
+        min_spread; otherwise apply is the identity until the next refresh.
+
+        :param n_probes: probe vectors (operator applications) per refresh,
+                         at least two for the agreement test
+        :param refresh: number of optimizer steps between two estimates
+        :param beta: weight of the running average across refreshes
+        :param max_noise: largest relative distance of the two half
+                          estimates
+        :param min_spread: smallest ratio of the largest to the smallest
+                           diagonal entry
+        """
+        self.n_probes = n_probes
+        self.refresh = refresh
+        self.beta = beta
+        self.max_noise = max_noise
+        self.min_spread = min_spread
+        self.diagonal = None
+        self.active = False
+        self.count = 0
+
+    def update(self, operator):
+        """
+        Called once per optimizer step; probes the operator every
+        `refresh` steps.
+
+        :param operator: MixedHessianOperator of the current step
+        """
+        self.count += 1
+        size = operator.n_x
+        if self.diagonal is not None and self.diagonal.shape[0] != size:
+            self.diagonal = None
+        if self.diagonal is not None and (self.count - 1) % self.refresh:
+            return
+        halves = torch.zeros(
+            2, size, dtype=operator.dtype, device=operator.device_x
+        )
+        for i in range(self.n_probes):
+            z = torch.empty_like(halves[0]).bernoulli_(0.5).mul_(2).sub_(1)
+            halves[i % 2].addcmul_(z, operator.matvec(z))
+        if self.n_probes > 1:
+            halves[0].div_((self.n_probes + 1) // 2)
+            halves[1].div_(self.n_probes // 2)
+            noise = (halves[0] - halves[1]).norm() / (
+                halves[0] + halves[1]
+            ).norm()
+            reliable = noise.item() <= self.max_noise
+            estimate = halves.mean(0)
+        else:
+            reliable = True
+            estimate = halves[0]
+        if self.diagonal is None:
+            self.diagonal = estimate
+        else:
+            self.diagonal.mul_(self.beta).add_(estimate, alpha=1 - self.beta)
+        # A = I + PSD, so its diagonal is bounded below by one
+        self.diagonal.clamp_(min=1.0)
+        spread = self.diagonal.max() / self.diagonal.min()
+        self.active = reliable and spread.item() >= self.min_spread
+
+    def apply(self, residual):
+        if not self.active:
+            return residual
+        return residual / self.diagonal
+
+
+class NystromApproximation(object):
+    def __init__(self, rank=20, refresh=10):
+        """
+        Randomized Nystrom approximation U * diag(lambda) * U^T of the PSD
+        term sqrt(lr_x) * D_xy * lr_y * D_yx * sqrt(lr_x) of the CG system
+        (Tropp, Yurtsever, Udell, Cevher 2017). With it, the system is
+        solved in closed form by the Woodbury identity at a fixed cost of
+        rank operator applications per refresh.
+
+        :param rank: rank of the approximation
+        :param refresh: number of optimizer steps between two sketches
+        """
+        self.rank = rank
+        self.refresh = refresh
+        self.basis = None
+        self.eigenvalues = None
+        self.count = 0
+
+    def update(self, operator):
+        """
+        Called once per optimizer step; sketches the operator every
+        `refresh` steps.
+
+        :param operator: MixedHessianOperator of the current step
+        :return: number of operator applications spent
+        """
+        self.count += 1
+        size = operator.n_x
+        if self.basis is not None and self.basis.shape[0] != size:
+            self.basis = None
+        if self.basis is not None and (self.count - 1) % self.refresh:
+            return 0
+        rank = self.sketch_rank(size)
+        # the sketch and its small factorizations are carried in float64,
+        # only the products run in the dtype of the operator
+        omega = self.test_matrix(size, rank, operator.device_x)
+        # A - I applied to the test matrix
+        Y = torch.stack(
+            [
+                operator.matvec(w.to(operator.dtype)).double() - w
+                for w in omega.t()
+            ],
+            dim=1,
+        ).detach()
+        nu = torch.finfo(Y.dtype).eps * Y.norm()
+        Y.add_(omega, alpha=nu)
+        gram = omega.t() @ Y
+        # B = Y * gram ** -1/2; the term is often of lower rank than the
+        # sketch, so the square root is taken on the numerically positive
+        # eigenvalues rather than by a Cholesky factorization
+        s, V = torch.linalg.eigh((gram + gram.t()) / 2)
+        keep = s > s.max() * torch.finfo(s.dtype).eps * rank
+        B = Y @ (V[:, keep] / s[keep].sqrt())
+        U, S, _ = torch.linalg.svd(B, full_matrices=False)
+        self.basis = U.to(operator.dtype)
+        self.eigenvalues = (S ** 2 - nu).clamp(min=0)
+        return rank
+
+    def sketch_rank(self, size):
+        return min(self.rank, size)
+
+    def test_matrix(self, size, rank, device):
+        """
+        Orthonormalized Gaussian test matrix of the sketch, in float64
+        """
+        omega, _ = torch.linalg.qr(
+            torch.randn(size, rank, device=device, dtype=torch.float64)
+        )
+        return omega
+
+    def apply(self, residual):
+        """
+        (I + U * diag(lambda) * U^T) ** -1 * residual by the Woodbury
+        identity; also usable as a CG preconditioner
+        """
+        basis = self.basis.to(residual.dtype)
+        weights = (self.eigenvalues / (1 + self.eigenvalues)).to(basis.dtype)
+        return residual - basis @ (weights * (basis.t() @ residual))
+
+
+class SketchPreconditioner(NystromApproximation):
+    def __init__(
+        self, rank=20, refresh=10, sketch='gaussian', memory_budget=2 ** 26
+    ):
+        """
+        Randomized Nystrom preconditioner of the CG system (Frangella, Tropp,
+        Udell 2021): the sketch of NystromApproximation, with a Gaussian or
+        subsampled randomized Hadamard (SRHT) test matrix, applied as
+        P ** -1 = (lambda_r + 1) * U * diag(lambda + 1) ** -1 * U^T
+                  + (I - U * U^T).
+        The preconditioned system has condition number at most about
+        lambda_(r+1) + 1 whatever the size of the players, and the factor U
+        is kept within memory_budget.
+
+        :param rank: largest rank of the approximation
+        :param refresh: number of optimizer steps between two sketches
+        :param sketch: 'gaussian' or 'srht'
+        :param memory_budget: bytes available to the factor U; the rank is
+                              reduced for large players
+        """
+        super(SketchPreconditioner, self).__init__(rank, refresh)
+        if sketch != 'gaussian' and sketch != 'srht':
+            raise RuntimeError('Sketch type is not valid')
+        self.sketch = sketch
+        self.memory_budget = memory_budget
+
+    def sketch_rank(self, size):
+        # float32 factor
+        rank = self.memory_budget // (4 * size)
+        return max(1, min(self.rank, size, rank))
+
+    def test_matrix(self, size, rank, device):
+        """
+        Columns of a Hadamard matrix of the next power of two, restricted to
+        size rows, with random signs; generated without forming the
+        Hadamard matrix, H[i, c] = (-1) ** popcount(i & c), in float64
+        """
+        if self.sketch == 'gaussian':
+            return super(SketchPreconditioner, self).test_matrix(
+                size, rank, device
+            )
+        bits = max(size - 1, 1).bit_length()
+        rows = torch.arange(size, device=device)
+        columns = torch.randperm(2 ** bits, device=device)[:rank]
+        parity = torch.zeros(size, rank, dtype=torch.bool, device=device)
+        for bit in range(bits):
+            parity ^= ((rows >> bit) & 1).bool()[:, None] & (
+                (columns >> bit) & 1
+            ).bool()[None, :]
+        signs = torch.empty(size, device=device, dtype=torch.float64)
+        signs.bernoulli_(0.5).mul_(2).sub_(1)
+        return (1 - 2 * parity.double()) * signs[:, None] / math.sqrt(size)
+
+    def apply(self, residual):
+        basis = self.basis.to(residual.dtype)
+        eigenvalues = self.eigenvalues.to(basis.dtype)
+        weights = (eigenvalues[-1] + 1) / (eigenvalues + 1) - 1
+        return residual + basis @ (weights * (basis.t() @ residual))
+
+
+def conjugate_gradient(
+    operator,
+    kk,
+    x=None,
+    nsteps=10,
+    residual_tol=1e-16,
+    preconditioner=None,
+    time_budget=None,
+    telemetry=None,
+):
+    '''
+
+    :param operator: MixedHessianOperator of the step
+    :param kk: right hand side b
+    :param x: initial guess, zero if None
+    :param nsteps: maximum number of iterations
+    :param residual_tol: tolerance on the squared residual relative to b
+    :param preconditioner: object whose apply(r) returns M ** -1 * r
+    :param time_budget: wall-clock budget of the solve in seconds
+    :param telemetry: SolverTelemetry receiving a record of the solve
+    :return: (I + sqrt(lr_x) * D_xy * lr_y * D_yx * sqrt(lr_x)) ** -1 * b,
+             number of iterations
+
+    '''
+    device_x = operator.device_x
+    warm_start = x is not None
+    if x is None:
+        x = torch.zeros(kk.shape[0], dtype=kk.dtype, device=device_x)
+    else:
+        x = x.to(device_x)
+
+    mm = kk.clone().detach()
+    mm = mm.to(device_x)
+    # the tolerance is relative to the right hand side, so that a warm
+    # start converges in fewer iterations
+    residual_tol = residual_tol * torch.dot(mm, mm)
+    if warm_start:
+        mm.sub_(operator.matvec(x))
+    zz = mm if preconditioner is None else preconditioner.apply(mm)
+    jj = zz.clone().detach()
+    jj = jj.to(device_x)
+    rdotr = torch.dot(mm, mm)
+    rdotz = rdotr if preconditioner is None else torch.dot(mm, zz)
+    initial_rdotr = rdotr
+    reason = 'max_iterations'
+    if rdotr <= residual_tol:
+        # an exact warm start (or b = 0) would divide 0 by 0
+        reason = 'converged'
+        nsteps = 0
+    start = time.time()
+    i = -1
+    for i in range(nsteps):
+        # To compute Avp
+        # (I + sqrt(lr_x) * D_xy * lr_y * D_yx * sqrt(lr_x)) * p
+        Avp_ = operator.matvec(jj)
+
+        alpha = rdotz / torch.dot(jj, Avp_)
+        x.data.add_(alpha * jj)
+        mm.data.add_(-alpha * Avp_)
+        rdotr = torch.dot(mm, mm)
+        if preconditioner is None:
+            zz = mm
+            new_rdotz = rdotr
+        else:
+            zz = preconditioner.apply(mm)
+            new_rdotz = torch.dot(mm, zz)
+        beta = new_rdotz / rdotz
+        jj = zz + beta * jj
+        rdotz = new_rdotz
+        if rdotr < residual_tol:
+            reason = 'converged'
+            break
+        if time_budget is not None and time.time() - start > time_budget:
+            reason = 'time_budget'
+            break
+    if telemetry is not None:
+        telemetry.record(
+            'cg',
+            i + 1,
+            initial_rdotr.sqrt(),
+            rdotr.sqrt(),
+            time.time() - start,
+            i + 1,
+            reason,
+        )
+    return x, i + 1
+
+
+def single_reduction_conjugate_gradient(
+    operator,
+    kk,
+    x=None,
+    nsteps=10,
+    residual_tol=1e-16,
+    preconditioner=None,
+    time_budget=None,
+    check_every=1,
+    telemetry=None,
+):
+    '''
+    CG with the two inner products of an iteration merged into a single
+    reduction (Chronopoulos, Gear 1989): the recurrence s = A * p is carried
+    along so that (r, r) and (A * r, r) are both known once A * r is.
+    The step sizes stay on the device between two convergence tests.
+
+    :param operator: MixedHessianOperator of the step
+    :param kk: right hand side b
+    :param x: initial guess, zero if None
+    :param nsteps: maximum number of iterations
+    :param residual_tol: tolerance on the squared residual relative to b
+    :param preconditioner: object whose apply(r) returns M ** -1 * r
+    :param time_budget: wall-clock budget of the solve in seconds
+    :param check_every: iterations between two convergence tests, each of
+                        which synchronizes with the host
+    :param telemetry: SolverTelemetry receiving a record of the solve
+    :return: operator ** -1 * b, number of iterations
+    '''
+    device_x = operator.device_x
+    mm = kk.clone().detach().to(device_x)
+    residual_tol = residual_tol * torch.dot(mm, mm)
+    if x is None:
+        x = torch.zeros(kk.shape[0], dtype=kk.dtype, device=device_x)
+    else:
+        x = x.to(device_x)
+        mm.sub_(operator.matvec(x))
+
+    def reduction(mm):
+        zz = mm if preconditioner is None else preconditioner.apply(mm)
+        Avp_ = operator.matvec(zz)
+        if preconditioner is None:
+            rdotz, wdotz = torch.mv(torch.stack([mm, Avp_]), mm)
+            return zz, Avp_, rdotz, wdotz, rdotz
+        rdotz, wdotz, rdotr = (
+            torch.stack([mm, Avp_, mm]) * torch.stack([zz, zz, mm])
+        ).sum(dim=1)
+        return zz, Avp_, rdotz, wdotz, rdotr
+
+    zz, Avp_, rdotz, wdotz, rdotr = reduction(mm)
+    initial_rdotr = rdotr
+    alpha = rdotz / wdotz
+    jj = zz.clone()
+    ss = Avp_.clone()
+    # convergence is tracked on the device; the iterations between two
+    # tests that follow it are no-ops, their step sizes being zeroed
+    active = torch.ones((), dtype=torch.bool, device=device_x)
+    iterations = torch.zeros((), dtype=torch.long, device=device_x)
+    zero = torch.zeros((), dtype=kk.dtype, device=device_x)
+    reason = 'max_iterations'
+    start = time.time()
+    for i in range(nsteps):
+        step = torch.where(active, alpha, zero)
+        x.add_(step * jj)
+        mm.sub_(step * ss)
+        iterations.add_(active)
+        zz, Avp_, new_rdotz, wdotz, rdotr = reduction(mm)
+        active = active & ~(rdotr < residual_tol)
+        if (i + 1) % check_every == 0 and not active:
+            reason = 'converged'
+            break
+        if time_budget is not None and time.time() - start > time_budget:
+            reason = 'time_budget'
+            break
+        beta = torch.where(active, new_rdotz / rdotz, zero)
+        alpha = new_rdotz / (wdotz - beta * new_rdotz / alpha)
+        rdotz = new_rdotz
+        jj = zz + beta * jj
+        ss = Avp_ + beta * ss
+    iterations = int(iterations)
+    if telemetry is not None:
+        telemetry.record(
+            'single_reduction_cg',
+            iterations,
+            initial_rdotr.sqrt(),
+            rdotr.sqrt(),
+            time.time() - start,
+            iterations,
+            reason,
+        )
+    return x, iterations
+
+
+def joint_conjugate_gradient(
+    operator_x,
+    operator_y,
+    kk_x,
+    kk_y,
+    x=None,
+    y=None,
+    nsteps=10,
+    residual_tol=1e-16,
+    time_budget=None,
+):
+    '''
+    CG on the systems of both players advanced together: at every
+    iteration the two D_yx products, and then the two D_xy products, of
+    the x and y systems share one batched traversal of the gradient graph
+    (MixedHessianOperator.joint_product). Each system keeps its own
+    recurrence and stops updating once it has converged.
+
+    :param operator_x: MixedHessianOperator of the step
+    :param operator_y: operator_x seen from the second player
+                       (operator_x.transpose(), possibly with other
+                       learning rates)
+    :param kk_x: right hand side of the x system
+    :param kk_y: right hand side of the y system
+    :param x: initial guess of the x system, zero if None
+    :param y: initial guess of the y system, zero if None
+    :param nsteps: maximum number of iterations
+    :param residual_tol: tolerance on the squared residuals relative to
+                         the right hand sides
+    :param time_budget: wall-clock budget of the solve in seconds
+    :return: operator_x ** -1 * kk_x, operator_y ** -1 * kk_y, number of
+             iterations of each system
+    '''
+
+    def matvec(p_x, p_y):
+        # D_xy of operator_y is D_yx of operator_x and vice versa
+        h_x, h_y = operator_x.joint_product(
+            operator_x.sqrt_lr_x * p_x,
+            operator_y.sqrt_lr_x * p_y.to(operator_y.device_x),
+        )
+        h_x = h_x * operator_x.lr_y
+        h_y = h_y * operator_y.lr_y
+        g_y, g_x = operator_x.joint_product(h_y, h_x)
+        return (
+            p_x + operator_x.sqrt_lr_x * g_x.to(p_x.device, p_x.dtype),
+            p_y + operator_y.sqrt_lr_x * g_y.to(p_y.device, p_y.dtype),
+        )
+
+    xs = []
+    residuals = []
+    tols = []
+    for kk, guess, device in (
+        (kk_x, x, operator_x.device_x),
+        (kk_y, y, operator_y.device_x),
+    ):
+        mm = kk.clone().detach().to(device)
+        tols.append(residual_tol * torch.dot(mm, mm))
+        residuals.append(mm)
+        if guess is None:
+            xs.append(torch.zeros(kk.shape[0], dtype=kk.dtype, device=device))
+        else:
+            xs.append(guess.to(device))
+    if x is not None or y is not None:
+        for mm, Avp_ in zip(residuals, matvec(*xs)):
+            mm.sub_(Avp_)
+    directions = [mm.clone() for mm in residuals]
+    rdotrs = [torch.dot(mm, mm) for mm in residuals]
+    converged = [False, False]
+    iterations = [0, 0]
+
+    start = time.time()
+    for i in range(nsteps):
+        Avps = matvec(*directions)
+        for k in range(2):
+            if converged[k]:
+                continue
+            alpha = rdotrs[k] / torch.dot(directions[k], Avps[k])
+            xs[k].add_(alpha * directions[k])
+            residuals[k].sub_(alpha * Avps[k])
+            new_rdotr = torch.dot(residuals[k], residuals[k])
+            beta = new_rdotr / rdotrs[k]
+            directions[k] = residuals[k] + beta * directions[k]
+            rdotrs[k] = new_rdotr
+            converged[k] = bool(new_rdotr < tols[k])
+            iterations[k] = i + 1
+        if all(converged):
+            break
+        if time_budget is not None and time.time() - start > time_budget:
+            break
+    return xs[0], xs[1], iterations[0], iterations[1]
+
+
 def general_conjugate_gradient(
     grad_x,
     grad_y,
@@ -297,6 +1626,9 @@ def general_conjugate_gradient(
     residual_tol=1e-16,
     device_x=torch.device('cpu'),
     device_y=torch.device('cpu'),
+    operator=None,
+    preconditioner=None,
+    telemetry=None,
 ):
     '''
 
@@ -311,58 +1643,602 @@ def general_conjugate_gradient(
     :param nsteps:
     :param residual_tol:
     :param device:
+    :param operator: MixedHessianOperator of the step, built here if None
+    :param preconditioner: object whose apply(r) returns M ** -1 * r
+    :param telemetry: SolverTelemetry receiving a record of the solve
     :return: (I + sqrt(lr_x) * D_xy * lr_y * D_yx * sqrt(lr_x)) ** -1 * b
 
     '''
-    if x is None:
-        x = torch.zeros(kk.shape[0], device=device_x)
     if grad_x.shape != kk.shape:
         raise RuntimeError('CG: hessian vector product shape mismatch')
-    lr_x = lr_x.sqrt().to(device_x)
-    lr_y = lr_y.to(device_y)
+    if operator is None:
+        operator = MixedHessianOperator(
+            grad_x,
+            grad_y,
+            x_params,
+            y_params,
+            lr_x,
+            lr_y,
+            device_x=device_x,
+            device_y=device_y,
+        )
+    return conjugate_gradient(
+        operator,
+        kk,
+        x=x,
+        nsteps=nsteps,
+        residual_tol=residual_tol,
+        preconditioner=preconditioner,
+        telemetry=telemetry,
+    )
+
+
+class KrylovRecycler(object):
+    def __init__(self, k=5, m=10, which='largest'):
+        """
+        Approximate eigenvectors of the CG operator carried from one solve to
+        the next to deflate it. After each solve, Rayleigh-Ritz on the span of
+        the kept vectors and of the last search directions selects the new
+        ones, evicting the rest.
+
+        :param k: number of kept vectors (parameter-sized)
+        :param m: number of first search directions harvested from a solve,
+                  in which the extreme eigenvalues appear first
+        :param which: 'largest' or 'smallest' end of the spectrum; for
+                      identity plus positive semi-definite the largest
+                      eigenvalues set the condition number
+        """
+        self.k = k
+        self.m = m
+        self.which = which
+        self.basis = None
+
+    def deflation(self, operator):
+        '''
+        :return: W, A * W and (W^T * A * W) ** -1 for the current operator,
+                 or None while no vector has been harvested
+        '''
+        if self.basis is None or self.basis.shape[0] != operator.n_x:
+            self.basis = None
+            return None
+        W = self.basis
+        AW = torch.stack([operator.matvec(w).clone() for w in W.t()], dim=1)
+        E = W.t() @ AW
+        return W, AW, torch.linalg.inv((E + E.t()) / 2)
+
+    def harvest(self, directions, A_directions, deflation=None):
+        '''
+        Rayleigh-Ritz on span(W, directions) with the products already
+        computed by the solve
+        '''
+        Z = list(directions)
+        AZ = list(A_directions)
+        if deflation is not None:
+            Z = list(deflation[0].t()) + Z
+            AZ = list(deflation[1].t()) + AZ
+        if not Z:
+            return
+        dtype = Z[0].dtype
+        # the small projected problem is solved in double precision, the
+        # directions of a single precision solve being far from orthogonal
+        Z = torch.stack(Z, dim=1).double()
+        AZ = torch.stack(AZ, dim=1).double()
+        # orthonormalize through Z^T * Z, dropping dependent directions
+        s, V = torch.linalg.eigh(Z.t() @ Z)
+        keep = s > s.max() * 1e-10
+        T = V[:, keep] / s[keep].sqrt()
+        H = T.t() @ (Z.t() @ AZ) @ T
+        theta, Y = torch.linalg.eigh((H + H.t()) / 2)
+        k = min(self.k, Y.shape[1])
+        Y = Y[:, -k:] if self.which == 'largest' else Y[:, :k]
+        basis, _ = torch.linalg.qr(Z @ (T @ Y))
+        self.basis = basis.to(dtype)
+
+
+def deflated_conjugate_gradient(
+    operator,
+    kk,
+    recycler,
+    x=None,
+    nsteps=10,
+    residual_tol=1e-16,
+    time_budget=None,
+):
+    '''
+    CG deflated by the vectors W kept in a KrylovRecycler (Saad, Yeung,
+    Erhel, Guyomarc'h 2000): every search direction is kept A-orthogonal to
+    W, and the recycler is refreshed from the first directions of the solve.
+
+    :param operator: MixedHessianOperator of the step
+    :param kk: right hand side b
+    :param recycler: KrylovRecycler shared by consecutive solves
+    :param x: initial guess, zero if None
+    :param nsteps: maximum number of iterations
+    :param residual_tol: tolerance on the squared residual relative to b
+    :param time_budget: wall-clock budget of the solve in seconds
+    :return: operator ** -1 * b, number of iterations
+    '''
+    device_x = operator.device_x
+    mm = kk.clone().detach().to(device_x)
+    residual_tol = residual_tol * torch.dot(mm, mm)
+    if x is None:
+        x = torch.zeros(kk.shape[0], dtype=kk.dtype, device=device_x)
+    else:
+        x = x.to(device_x)
+        mm.sub_(operator.matvec(x))
+
+    deflation = recycler.deflation(operator)
+    if deflation is not None:
+        deflation = [m.to(mm.dtype) for m in deflation]
+        W, AW, E_inv = deflation
+        # Galerkin projection of the error on span(W)
+        mu = E_inv @ (W.t() @ mm)
+        x.add_(W @ mu)
+        mm.sub_(AW @ mu)
+        jj = mm - W @ (E_inv @ (AW.t() @ mm))
+    else:
+        jj = mm.clone()
+    directions = []
+    A_directions = []
 
-    mm = kk.clone().detach()
-    mm = mm.to(device_x)
-    jj = mm.clone().detach()
-    jj = jj.to(device_x)
     rdotr = torch.dot(mm, mm)
-    residual_tol = residual_tol * rdotr
-    x_params = tuple(x_params)
-    y_params = tuple(y_params)
+    start = time.time()
+    i = -1
     for i in range(nsteps):
-        # To compute Avp
-        # h_1 = Hvp_vec(grad_vec=grad_x, params=y_params, vec=lr_x * p, retain_graph=True)
-        h_1 = Hvp_vec(
-            grad_vec=grad_x.to(device_x),
-            params=y_params,
-            vec=lr_x * jj,
-            retain_graph=True,
-        ).mul_(lr_y)
-        # h_1.mul_(lr_y)
-        # lr_y * D_yx * b
-        # h_2 = Hvp_vec(grad_vec=grad_y, params=x_params, vec=lr_y * h_1, retain_graph=True)
-        h_2 = Hvp_vec(
-            grad_vec=grad_y.to(device_x),
-            params=x_params,
-            vec=h_1.to(device_x),
-            retain_graph=True,
-        ).mul_(lr_x)
-        # h_2.mul_(lr_x)
-        # lr_x * D_xy * lr_y * D_yx * b
-        Avp_ = jj + h_2
+        Avp_ = operator.matvec(jj)
+        if len(directions) < recycler.m:
+            directions.append(jj)
+            A_directions.append(Avp_.clone())
 
         alpha = rdotr / torch.dot(jj, Avp_)
-        x.data.add_(alpha * jj)
-        mm.data.add_(-alpha * Avp_)
+        x.add_(alpha * jj)
+        mm.add_(-alpha * Avp_)
+        if deflation is not None:
+            # W^T * r drifts from zero in single precision, project it again
+            mu = E_inv @ (W.t() @ mm)
+            x.add_(W @ mu)
+            mm.sub_(AW @ mu)
         new_rdotr = torch.dot(mm, mm)
         beta = new_rdotr / rdotr
         jj = mm + beta * jj
+        if deflation is not None:
+            jj.sub_(W @ (E_inv @ (AW.t() @ jj)))
         rdotr = new_rdotr
         if rdotr < residual_tol:
             break
+        if time_budget is not None and time.time() - start > time_budget:
+            break
+    recycler.harvest(directions, A_directions, deflation)
     return x, i + 1
 
 
+def largest_eigenvalue(operator, n_iterations=5, vec=None):
+    '''
+    Power iteration estimate of the largest eigenvalue of the operator
+
+    :param operator: MixedHessianOperator of the step
+    :param n_iterations: number of operator applications
+    :param vec: starting vector, e.g. the eigenvector of the previous step
+    :return: eigenvalue estimate, eigenvector estimate
+    '''
+    if vec is None or vec.shape[0] != operator.n_x:
+        vec = torch.randn(operator.n_x, device=operator.device_x)
+    vec = vec / vec.norm()
+    eigenvalue = torch.ones(1, device=operator.device_x)
+    for _ in range(n_iterations):
+        Avp_ = operator.matvec(vec)
+        eigenvalue = torch.dot(vec, Avp_)
+        vec = Avp_ / Avp_.norm()
+    return eigenvalue, vec
+
+
+def lanczos(matvec, size, device, n_iterations=20, vec=None):
+    '''
+    Ritz values of a symmetric operator from n_iterations steps of Lanczos
+    with full reorthogonalization; the extreme ones converge first.
+
+    :param matvec: callable returning operator * vec
+    :param size: dimension of the operator
+    :param device: device of the vectors
+    :param n_iterations: number of operator applications
+    :param vec: starting vector, random if None
+    :return: Ritz values in ascending order
+    '''
+    if vec is None or vec.shape[0] != size:
+        vec = torch.randn(size, device=device)
+    vec = vec / vec.norm()
+    basis = [vec]
+    alphas = []
+    betas = []
+    for j in range(min(n_iterations, size)):
+        w = matvec(basis[j]).to(device).clone()
+        alphas.append(float(torch.dot(w, basis[j])))
+        V = torch.stack(basis, dim=1)
+        w.sub_(V @ (V.t() @ w))
+        w.sub_(V @ (V.t() @ w))
+        beta = float(w.norm())
+        if beta <= 1e-10 * max(abs(a) for a in alphas):
+            break
+        betas.append(beta)
+        basis.append(w / beta)
+    k = len(alphas)
+    T = torch.diag(torch.tensor(alphas, dtype=torch.float64))
+    off = torch.tensor(betas[: k - 1], dtype=torch.float64)
+    T = T + torch.diag(off, 1) + torch.diag(off, -1)
+    return torch.linalg.eigvalsh(T)
+
+
+class SpectralEstimator(object):
+    def __init__(self, n_iterations=20, every=100):
+        """
+        Extreme eigenvalues of the cross term D_xy * D_yx and of the
+        diagonal blocks D_xx and D_yy, estimated by Lanczos every `every`
+        optimizer steps, from which a stable learning rate and the CG
+        iteration count are predicted. A single step at the start of a run
+        gives the estimates before committing to a learning rate.
+
+        :param n_iterations: Lanczos steps per block (the cross term takes
+                             two products per step)
+        :param every: number of optimizer steps between two estimates
+        """
+        self.n_iterations = n_iterations
+        self.every = every
+        self.count = 0
+        self.estimates = None
+        self.history = []
+
+    def update(self, operator):
+        """
+        Called once per optimizer step with its MixedHessianOperator
+        """
+        self.count += 1
+        if (self.count - 1) % self.every:
+            return
+        cross = lanczos(
+            lambda vec: operator.D_xy(operator.D_yx(vec)),
+            operator.n_x,
+            operator.device_x,
+            self.n_iterations,
+        )
+        xx = lanczos(
+            operator.D_xx, operator.n_x, operator.device_x, self.n_iterations
+        )
+        yy = lanczos(
+            operator.D_yy, operator.n_y, operator.device_y, self.n_iterations
+        )
+        self.estimates = {
+            'cross': max(float(cross[-1]), 0.0),
+            'cross_ritz': cross.flip(0).clamp(min=0).tolist(),
+            'xx': (float(xx[0]), float(xx[-1])),
+            'yy': (float(yy[0]), float(yy[-1])),
+        }
+        self.history.append((self.count, self.estimates))
+
+    def cg_iterations(self, lr_x, lr_y, tol=1e-8):
+        '''
+        Upper bound on the CG iterations reducing the residual by tol: the
+        condition number bound of the CGD system
+        I + lr_x * lr_y * D_xy * D_yx after removing the j largest Ritz
+        values, each costing about one iteration, with the best j.
+        '''
+        scale = float(lr_x) * float(lr_y)
+        log_tol = math.log(2 / tol)
+        # only the largest Ritz values have converged
+        ritz = self.estimates['cross_ritz']
+        return min(
+            j + int(math.ceil(0.5 * math.sqrt(1 + scale * theta) * log_tol))
+            for j, theta in enumerate(ritz[: max(len(ritz) // 4, 1)])
+        )
+
+    def max_learning_rate(self, cg_budget=None, tol=1e-8):
+        '''
+        Largest learning rate, the same for both players, for which the
+        gradient steps on the diagonal blocks are stable (lr < 2 / |lambda|)
+        and, with cg_budget, CG reaches tol within cg_budget iterations
+        '''
+        curvature = max(
+            abs(e) for e in self.estimates['xx'] + self.estimates['yy']
+        )
+        lr = 2 / curvature if curvature > 0 else math.inf
+        if cg_budget is not None and self.estimates['cross'] > 0:
+            kappa = (2 * cg_budget / math.log(2 / tol)) ** 2
+            lr = min(
+                lr, math.sqrt(max(kappa - 1, 0) / self.estimates['cross'])
+            )
+        return lr
+
+
+def chebyshev(
+    operator,
+    kk,
+    x=None,
+    nsteps=10,
+    lambda_min=1.0,
+    lambda_max=None,
+    power_iterations=5,
+    safety=1.1,
+    max_restarts=3,
+    residual_tol=None,
+):
+    '''
+    Chebyshev semi-iteration: a fixed number of sweeps with no inner
+    products, hence no device synchronization inside the loop.
+
+    :param operator: MixedHessianOperator of the step
+    :param kk: right hand side b
+    :param x: initial guess, zero if None
+    :param nsteps: number of sweeps
+    :param lambda_min: lower bound of the spectrum, exactly 1 for
+                       identity plus positive semi-definite
+    :param lambda_max: upper bound of the spectrum, estimated by power
+                       iteration if None
+    :param power_iterations: power iterations for the estimate of lambda_max
+    :param safety: factor enlarging the estimate of lambda_max, which power
+                   iteration approaches from below
+    :param max_restarts: the residual norm is checked once after the sweeps;
+                         if it did not shrink by the factor guaranteed for a
+                         spectrum in [lambda_min, lambda_max], lambda_max was
+                         underestimated and the sweeps are restarted with
+                         twice the bound
+    :param residual_tol: residual norm relative to b the solve must also
+                         reach to count as converged, if not None
+    :return: operator ** -1 * b, number of sweeps, and whether the solve
+             converged: the contraction held (and residual_tol was met)
+    '''
+    device_x = operator.device_x
+    if lambda_max is None:
+        lambda_max, _ = largest_eigenvalue(operator, power_iterations)
+        lambda_max = safety * lambda_max
+    x0 = None if x is None else x.to(device_x)
+    b = kk.detach().to(device_x)
+    b_norm = b.norm()
+    converged = False
+    for restart in range(max_restarts + 1):
+        if x0 is None:
+            x = torch.zeros(kk.shape[0], dtype=kk.dtype, device=device_x)
+            residual = b.clone()
+        else:
+            x = x0.clone()
+            residual = b - operator.matvec(x)
+        initial_norm = residual.norm()
+
+        theta = (lambda_max + lambda_min) / 2
+        delta = (lambda_max - lambda_min) / 2
+        if float(delta) <= 0:
+            # the operator is the identity up to the estimate
+            return x.add_(residual / theta), 1, True
+        sigma = theta / delta
+        rho = 1 / sigma
+        direction = residual / theta
+        for i in range(nsteps):
+            x.add_(direction)
+            residual.sub_(operator.matvec(direction))
+            rho_new = 1 / (2 * sigma - rho)
+            direction.mul_(rho_new * rho).add_(
+                residual * (2 * rho_new / delta)
+            )
+            rho = rho_new
+        # on [lambda_min, lambda_max] the residual polynomial is bounded by
+        # 1 / T_nsteps(sigma); a factor 10 covers the rounding errors
+        exponent = nsteps * math.acosh(float(sigma))
+        contraction = 1 / math.cosh(exponent) if exponent < 700 else 0.0
+        residual_norm = residual.norm()
+        if residual_norm <= 10 * contraction * initial_norm + 1e-6 * b_norm:
+            converged = residual_tol is None or bool(
+                residual_norm <= residual_tol * b_norm
+            )
+            break
+        lambda_max = 2 * lambda_max
+    return x, nsteps * (restart + 1), converged
+
+
+def neumann_series(operator, kk, x=None, nsteps=10):
+    '''
+    Truncated Neumann series of (I + A) ** -1 * b, written as the Richardson
+    iteration x <- b - A * x: a fixed number of operator applications with
+    no inner products and no stopping test. Converges only if the spectral
+    radius of A is below 1, the error shrinking by that factor per term.
+
+    :param operator: MixedHessianOperator of the step, I + A
+    :param kk: right hand side b
+    :param x: initial guess, b (the first term of the series) if None
+    :param nsteps: number of operator applications
+    :return: operator ** -1 * b, number of operator applications
+    '''
+    b = kk.detach().to(operator.device_x)
+    if x is None:
+        x = b.clone()
+    else:
+        x = x.to(operator.device_x)
+    for _ in range(nsteps):
+        # b - A * x = b + x - (I + A) * x
+        x = b + x - operator.matvec(x)
+    return x, nsteps
+
+
+class ShiftedHessianOperator(object):
+    def __init__(self, hvp, size, device, scale=2.0):
+        '''
+        I - scale * H for a Hessian-vector product H, the system matrix of
+        the Newton optimizer. Symmetric but indefinite once the curvature
+        exceeds 1 / scale.
+
+        :param hvp: callable returning H * vec (e.g. MixedHessianOperator.D_xx)
+        :param size: number of parameters
+        :param device: device of the parameters
+        :param scale: factor of the Hessian
+        '''
+        self.hvp = hvp
+        self.scale = scale
+        self.n_x = size
+        self.device_x = device
+
+    def matvec(self, vec):
+        return vec - self.scale * self.hvp(vec).to(self.device_x)
+
+    __matmul__ = matvec
+
+
+def minres(
+    operator, kk, x=None, nsteps=10, residual_tol=1e-16, time_budget=None
+):
+    '''
+    MINRES (Paige, Saunders 1975) for symmetric, possibly indefinite
+    systems: Lanczos with Givens rotations, minimizing the residual over the
+    Krylov subspace with a short recurrence. The residual norm comes out of
+    the rotations without an extra product.
+
+    :param operator: symmetric operator with matvec, n_x and device_x
+    :param kk: right hand side b
+    :param x: initial guess, zero if None
+    :param nsteps: maximum number of iterations
+    :param residual_tol: tolerance on the squared residual relative to b
+    :param time_budget: wall-clock budget of the solve in seconds
+    :return: operator ** -1 * b, number of iterations, relative residual
+    '''
+    device_x = operator.device_x
+    b = kk.clone().detach().to(device_x)
+    b_norm = b.norm()
+    if x is None:
+        x = torch.zeros(kk.shape[0], dtype=kk.dtype, device=device_x)
+        v = b
+    else:
+        x = x.to(device_x)
+        v = b - operator.matvec(x)
+    gamma = v.norm()
+    eta = gamma
+    if float(b_norm) == 0 or float(gamma) == 0:
+        return x, 0, 0.0
+    v = v / gamma
+    v_old = torch.zeros_like(v)
+    w = torch.zeros_like(v)
+    w_old = torch.zeros_like(v)
+    c, c_old = 1.0, 1.0
+    s, s_old = 0.0, 0.0
+    tol = math.sqrt(residual_tol) * b_norm
+    start = time.time()
+    i = -1
+    for i in range(nsteps):
+        Avp_ = operator.matvec(v)
+        delta = torch.dot(v, Avp_)
+        v_new = Avp_ - delta * v - gamma * v_old
+        gamma_new = v_new.norm()
+        # QR factorization of the tridiagonal Lanczos matrix
+        alpha_0 = c * delta - c_old * s * gamma
+        alpha_1 = torch.sqrt(alpha_0 ** 2 + gamma_new ** 2)
+        alpha_2 = s * delta + c_old * c * gamma
+        alpha_3 = s_old * gamma
+        c_old, s_old = c, s
+        c, s = alpha_0 / alpha_1, gamma_new / alpha_1
+        w_new = (v - alpha_3 * w_old - alpha_2 * w) / alpha_1
+        x.add_(c * eta * w_new)
+        eta = -s * eta
+        w_old, w = w, w_new
+        v_old, v = v, v_new / gamma_new
+        gamma = gamma_new
+        if abs(eta) < tol or float(gamma_new) == 0:
+            break
+        if time_budget is not None and time.time() - start > time_budget:
+            break
+    return x, i + 1, float(abs(eta) / b_norm)
+
+
+def gmres(
+    operator,
+    kk,
+    x=None,
+    nsteps=10,
+    restart=20,
+    residual_tol=1e-16,
+    time_budget=None,
+):
+    '''
+    Restarted GMRES (Saad, Schultz 1986) for general systems: Arnoldi with
+    modified Gram-Schmidt and Givens rotations, restarted every `restart`
+    iterations to bound the memory to restart + 1 parameter-sized vectors.
+    On a symmetric system use minres, whose short recurrence keeps the
+    whole Krylov subspace without restarts.
+
+    :param operator: operator with matvec, n_x and device_x
+    :param kk: right hand side b
+    :param x: initial guess, zero if None
+    :param nsteps: maximum number of iterations over all cycles
+    :param restart: iterations per cycle
+    :param residual_tol: tolerance on the squared residual relative to b
+    :param time_budget: wall-clock budget of the solve in seconds
+    :return: operator ** -1 * b, number of iterations, relative residual
+    '''
+    device_x = operator.device_x
+    b = kk.clone().detach().to(device_x)
+    b_norm = float(b.norm())
+    x_given = x is not None
+    if x is None:
+        x = torch.zeros(kk.shape[0], dtype=kk.dtype, device=device_x)
+    else:
+        x = x.to(device_x)
+    if b_norm == 0:
+        return x, 0, 0.0
+    tol = math.sqrt(residual_tol) * b_norm
+    start = time.time()
+    iterations = 0
+    residual = None if x_given else b
+    residual_norm = b_norm
+    while iterations < nsteps:
+        if residual is None:
+            residual = b - operator.matvec(x)
+        beta = float(residual.norm())
+        residual_norm = beta
+        if beta < tol:
+            break
+        V = [residual / beta]
+        residual = None
+        # Hessenberg matrix and rotations are small, kept on the host
+        H = torch.zeros(restart + 1, restart, dtype=torch.float64)
+        g = torch.zeros(restart + 1, dtype=torch.float64)
+        g[0] = beta
+        cs = torch.zeros(restart, dtype=torch.float64)
+        sn = torch.zeros(restart, dtype=torch.float64)
+        for j in range(restart):
+            w = operator.matvec(V[j]).clone()
+            for k in range(j + 1):
+                H[k, j] = float(torch.dot(w, V[k]))
+                w.sub_(V[k], alpha=float(H[k, j]))
+            h_next = float(w.norm())
+            H[j + 1, j] = h_next
+            for k in range(j):
+                H[k, j], H[k + 1, j] = (
+                    cs[k] * H[k, j] + sn[k] * H[k + 1, j],
+                    -sn[k] * H[k, j] + cs[k] * H[k + 1, j],
+                )
+            denominator = torch.hypot(H[j, j], H[j + 1, j])
+            cs[j], sn[j] = H[j, j] / denominator, H[j + 1, j] / denominator
+            H[j, j] = denominator
+            H[j + 1, j] = 0
+            g[j + 1] = -sn[j] * g[j]
+            g[j] = cs[j] * g[j]
+            iterations += 1
+            residual_norm = float(abs(g[j + 1]))
+            out_of_time = (
+                time_budget is not None and time.time() - start > time_budget
+            )
+            if (
+                residual_norm < tol
+                or h_next == 0
+                or iterations >= nsteps
+                or out_of_time
+            ):
+                break
+            V.append(w / h_next)
+        y = torch.linalg.solve_triangular(
+            H[: j + 1, : j + 1], g[: j + 1, None], upper=True
+        )[:, 0]
+        for k in range(j + 1):
+            x.add_(V[k], alpha=float(y[k]))
+        if residual_norm < tol or out_of_time:
+            break
+    return x, iterations, residual_norm / b_norm
+
+
 #######################################################################
 def general_conjugate_gradient_jacobi(
     grad_x,
@@ -372,6 +2248,8 @@ def general_conjugate_gradient_jacobi(
     nsteps=10,
     residual_tol=1e-16,
     device=torch.device('cpu'),
+    hvp=None,
+    telemetry=None,
 ):
     '''
 
@@ -379,10 +2257,13 @@ def general_conjugate_gradient_jacobi(
     :param x_params:
     :param b:
     :param lr_x:
-    :param x:
+    :param x: initial guess; the residual starts from right_side, so
+              the solve is only consistent from zero (None)
     :param nsteps:
     :param residual_tol:
     :param device:
+    :param hvp: callable returning D_xx * vec (e.g. MixedHessianOperator.D_xx)
+    :param telemetry: SolverTelemetry receiving a record of the solve
     :return: (A) ** -1 * (right_side)
 
     '''
@@ -397,16 +2278,21 @@ def general_conjugate_gradient_jacobi(
     right_side_clone2 = right_side_clone2.to(device)
 
     rdotr = torch.dot(right_side_clone1, right_side_clone1)
+    initial_rdotr = rdotr
     residual_tol = residual_tol * rdotr
-    x_params = tuple(x_params)
+    if hvp is None:
+        x_params = tuple(x_params)
+        grad_x = grad_x.to(device)
 
+        def hvp(vec):
+            return Hvp_vec(
+                grad_vec=grad_x, params=x_params, vec=vec, retain_graph=True
+            )
+
+    reason = 'max_iterations'
+    start = time.time()
     for i in range(nsteps):
-        h_1 = Hvp_vec(
-            grad_vec=grad_x.to(device),
-            params=x_params,
-            vec=2 * x,
-            retain_graph=True,
-        )
+        h_1 = hvp(2 * x)
         H = -h_1.to(device) + x
         Avp_ = right_side_clone2 + H
 
@@ -418,7 +2304,18 @@ def general_conjugate_gradient_jacobi(
         right_side_clone2 = right_side_clone1 + beta * right_side_clone2
         rdotr = new_rdotr
         if rdotr < residual_tol:
+            reason = 'converged'
             break
+    if telemetry is not None:
+        telemetry.record(
+            'cg_jacobi',
+            i + 1,
+            initial_rdotr.sqrt(),
+            rdotr.sqrt(),
+            time.time() - start,
+            i + 1,
+            reason,
+        )
     return x, i + 1
 
 